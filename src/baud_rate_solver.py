@@ -0,0 +1,163 @@
+from dataclasses import dataclass
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from pic_formulas import get_baud_rate_divider, get_max_SPBRG_value
+
+
+STANDARD_BAUD_RATES = (1200, 2400, 4800, 9600, 19200, 38400, 57600, 115200,
+                       230400, 250000, 460800, 500000, 921600, 1000000)
+
+# Error de baudios tolerable entre el PIC y el adaptador USB-UART
+MAX_BAUD_RATE_ERROR = 0.02
+
+
+@dataclass(frozen=True)
+class BaudRateMode:
+    SYNC: bool
+    BRG16: bool
+    BRGH: bool
+
+    @property
+    def divider(self) -> int:
+        return get_baud_rate_divider(self.SYNC, self.BRG16, self.BRGH)
+
+    @property
+    def max_SPBRG(self) -> int:
+        return get_max_SPBRG_value(self.BRG16)
+
+
+# Con SYNC = 1 el bit BRGH no tiene efecto, así que esos modos aparecen una vez
+BAUD_RATE_MODES = (
+    BaudRateMode(SYNC=False, BRG16=False, BRGH=False),
+    BaudRateMode(SYNC=False, BRG16=False, BRGH=True),
+    BaudRateMode(SYNC=False, BRG16=True, BRGH=False),
+    BaudRateMode(SYNC=False, BRG16=True, BRGH=True),
+    BaudRateMode(SYNC=True, BRG16=False, BRGH=False),
+    BaudRateMode(SYNC=True, BRG16=True, BRGH=False),
+)
+
+ASYNC_BAUD_RATE_MODES = tuple(mode for mode in BAUD_RATE_MODES if not mode.SYNC)
+
+
+@dataclass(frozen=True)
+class BaudRateConfiguration:
+    baudrate: float  # Baudios pedidos
+    mode: BaudRateMode
+    SPBRG: int  # SPBRGH:SPBRGL
+    achieved_baudrate: float
+
+    @property
+    def error(self) -> float:
+        """ Error relativo del baud rate generado """
+        return self.achieved_baudrate / self.baudrate - 1
+
+    @property
+    def SPBRGH(self) -> int:
+        return self.SPBRG >> 8
+
+    @property
+    def SPBRGL(self) -> int:
+        return self.SPBRG & 0xFF
+
+
+def get_SPBRG_candidates(F_osc: float, baudrates: np.ndarray,
+                         modes: Tuple[BaudRateMode, ...]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mejor SPBRGH:SPBRGL de cada modo para cada baud rate, con forma (modos, baudios),
+    y el error relativo que resulta. El error es infinito si el modo no alcanza ese baud rate.
+    """
+    baudrates = np.asarray(baudrates, dtype=float)
+
+    dividers = np.array([mode.divider for mode in modes], dtype=float)[:, np.newaxis]
+    max_SPBRG = np.array([mode.max_SPBRG for mode in modes])[:, np.newaxis]
+
+    ideal = F_osc / (dividers * baudrates) - 1
+
+    # Entre el valor inferior y el superior gana el de menor error
+    lower = np.clip(np.floor(ideal), 0, max_SPBRG)
+    upper = np.clip(lower + 1, 0, max_SPBRG)
+
+    lower_error = F_osc / (dividers * (lower + 1)) / baudrates - 1
+    upper_error = F_osc / (dividers * (upper + 1)) / baudrates - 1
+
+    SPBRG = np.where(np.abs(lower_error) <= np.abs(upper_error), lower, upper).astype(np.int64)
+    error = np.where(np.abs(lower_error) <= np.abs(upper_error), lower_error, upper_error)
+
+    error = np.where((ideal < -0.5) | (ideal > max_SPBRG + 0.5), np.inf, error)
+
+    return SPBRG, error
+
+
+def solve_baud_rate(F_osc: float, baudrate: float,
+                    modes: Tuple[BaudRateMode, ...] = BAUD_RATE_MODES) -> List[BaudRateConfiguration]:
+    """ Configuraciones de todos los modos que alcanzan `baudrate`, de menor a mayor error """
+    SPBRG, error = get_SPBRG_candidates(F_osc, np.array([baudrate]), modes)
+
+    configurations = [
+        BaudRateConfiguration(baudrate=baudrate,
+                              mode=mode,
+                              SPBRG=int(SPBRG[i, 0]),
+                              achieved_baudrate=F_osc / (mode.divider * (int(SPBRG[i, 0]) + 1)))
+        for i, mode in enumerate(modes) if np.isfinite(error[i, 0])
+    ]
+
+    return sorted(configurations, key=lambda configuration: abs(configuration.error))
+
+
+def solve_baud_rates(
+        F_osc: float,
+        baudrates: Iterable[float] = STANDARD_BAUD_RATES,
+        modes: Tuple[BaudRateMode, ...] = ASYNC_BAUD_RATE_MODES
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Mejor modo para cada baud rate a la vez. Entrega el índice del modo en `modes`,
+    el SPBRGH:SPBRGL y el error relativo (infinito si no se puede generar).
+    """
+    SPBRG, error = get_SPBRG_candidates(F_osc, np.asarray(list(baudrates), dtype=float), modes)
+
+    best = np.argmin(np.abs(error), axis=0)
+    columns = np.arange(error.shape[-1])
+
+    return best, SPBRG[best, columns], error[best, columns]
+
+
+def get_fastest_baud_rate(
+        F_osc: float,
+        max_baudrate: float = STANDARD_BAUD_RATES[-1],
+        max_error: float = MAX_BAUD_RATE_ERROR,
+        baudrates: Iterable[float] = STANDARD_BAUD_RATES
+) -> BaudRateConfiguration:
+    """ Baud rate estándar más alto, hasta `max_baudrate`, que el EUSART genera con error tolerable """
+    candidates = [baudrate for baudrate in baudrates if baudrate <= max_baudrate]
+
+    modes, SPBRG, error = solve_baud_rates(F_osc, candidates)
+
+    usable = np.flatnonzero(np.abs(error) <= max_error)
+
+    if not len(usable):
+        raise ValueError(f'No standard baud rate up to {max_baudrate:g} is reachable within {100 * max_error:g} %')
+
+    i = usable[np.argmax(np.asarray(candidates)[usable])]
+    mode = ASYNC_BAUD_RATE_MODES[modes[i]]
+
+    return BaudRateConfiguration(baudrate=candidates[i],
+                                 mode=mode,
+                                 SPBRG=int(SPBRG[i]),
+                                 achieved_baudrate=F_osc / (mode.divider * (int(SPBRG[i]) + 1)))
+
+
+if __name__ == "__main__":
+    F_osc = 48e6
+
+    modes, SPBRG, error = solve_baud_rates(F_osc)
+
+    for baudrate, mode, value, relative_error in zip(STANDARD_BAUD_RATES, modes, SPBRG, error):
+        mode = ASYNC_BAUD_RATE_MODES[mode]
+
+        print(f'{baudrate:7d} baud: BRG16={mode.BRG16:d} BRGH={mode.BRGH:d} SPBRG={value:5d}, '
+              f'error {100 * relative_error:+.3f} %')
+
+    fastest = get_fastest_baud_rate(F_osc)
+    print(f'Más rápido: {fastest.baudrate} baud ({100 * fastest.error:+.3f} %)')
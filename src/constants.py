@@ -1,12 +1,21 @@
 from dataclasses import dataclass
 
+from pwm_frequency_index import get_pwm_frequency_index
+
+
+F_OSC = 48e6
+TMR2_PRESCALER = 16
+
+# Rango de diseño llevado a frecuencias que el PWM puede generar con PR2 entero
+MIN_FREQ, MAX_FREQ = get_pwm_frequency_index(F_OSC, (TMR2_PRESCALER,)).snap_range(20e3, 30e3)
+
 
 @dataclass(frozen=True)
 class PICValues:
     """ Valores de diesño """
 
-    MIN_FREQ: float = 20e3
-    MAX_FREQ: float = 30e3
+    MIN_FREQ: float = MIN_FREQ
+    MAX_FREQ: float = MAX_FREQ
 
     MIN_DUTY_CYCLE: float = .10
     MAX_DUTY_CYCLE: float = .57
@@ -17,5 +26,5 @@ class PICValues:
 
     """ Valores de configureción del microcontrolador """
 
-    F_OSC: float = 48e6
-    TMR2_PRESCALER: int = 16
+    F_OSC: float = F_OSC
+    TMR2_PRESCALER: int = TMR2_PRESCALER
@@ -0,0 +1,272 @@
+import csv
+import json
+import os
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, fields
+from itertools import product
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from spwm_analysis import analyze_register_tables
+from pwm_frequency_index import get_pwm_configuration
+from spwm_engine import get_duty_cycle_matrix, get_CCPRxL_CCPxCON_matrices
+
+
+# Se debe incrementar cada vez que cambie cómo se evalúa un punto
+SWEEP_VERSION = 2
+
+DEFAULT_MODULATION_INDICES = tuple(mod / 100 for mod in range(20, 96, 5))
+
+# Puntos por tarea del pool: un punto sin THD tarda menos que enviarlo a otro proceso
+MAX_CHUNK_SIZE = 256
+CHUNKS_PER_WORKER = 4
+
+
+class SweepOptionsMismatchError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class SweepPoint:
+    switching_frequency: float
+    output_frequency: float
+    F_osc: float
+    TMR2_prescaler: int
+
+
+@dataclass(frozen=True)
+class SweepResult:
+    switching_frequency: float
+    output_frequency: float
+    F_osc: float
+    TMR2_prescaler: int
+
+    valid: bool
+    PR2: Optional[int] = None
+    achieved_switching_frequency: Optional[float] = None
+    switching_frequency_error: Optional[float] = None  # relativo
+    samples: Optional[int] = None
+    achieved_output_frequency: Optional[float] = None
+    output_frequency_error: Optional[float] = None  # relativo
+    duty_resolution_bits: Optional[float] = None
+    table_flash_bytes: Optional[int] = None  # Tablas completas CCPRxL + CCPxCON
+    compressed_table_flash_bytes: Optional[int] = None  # Cuarto de onda con CCPxCON empaquetado
+    max_thd: Optional[float] = None  # Peor THD de las tablas (h <= 50), si se pidió
+
+    @property
+    def point(self) -> SweepPoint:
+        return SweepPoint(self.switching_frequency, self.output_frequency, self.F_osc, self.TMR2_prescaler)
+
+
+RESULT_FIELDS = [field.name for field in fields(SweepResult)]
+
+
+def get_sweep_points(
+        switching_frequencies: Iterable[float],
+        output_frequencies: Iterable[float],
+        oscillator_frequencies: Iterable[float],
+        TMR2_prescalers: Iterable[int]
+) -> List[SweepPoint]:
+    return [SweepPoint(*values) for values in product(switching_frequencies,
+                                                      output_frequencies,
+                                                      oscillator_frequencies,
+                                                      TMR2_prescalers)]
+
+
+def evaluate_point(
+        point: SweepPoint,
+        modulation_indices: Tuple[float, ...] = DEFAULT_MODULATION_INDICES,
+        compute_thd: bool = False
+) -> SweepResult:
+    """ Evalúa una configuración con el PR2 entero más cercano, que es lo que se carga en el PIC """
+    try:
+        configuration = get_pwm_configuration(point.switching_frequency, point.F_osc, point.TMR2_prescaler)
+    except ValueError:
+        return SweepResult(**asdict(point), valid=False)
+
+    PR2 = configuration.PR2
+    achieved_switching_frequency = configuration.frequency
+
+    N = int(achieved_switching_frequency / point.output_frequency)
+
+    if N < 4:
+        return SweepResult(**asdict(point), valid=False, PR2=PR2)
+
+    achieved_output_frequency = achieved_switching_frequency / N
+
+    max_thd = None
+
+    if compute_thd:
+        # Con N explícito: derivarlo de nuevo de achieved_output_frequency puede dar N - 1
+        duty_cycles = get_duty_cycle_matrix(achieved_switching_frequency, achieved_output_frequency,
+                                            modulation_indices, sample_count=N)
+        CCPRxL, CCPxCON = get_CCPRxL_CCPxCON_matrices(PR2, duty_cycles)
+
+        # El THD tiene que ser el de la tabla que se reporta en `samples` y `table_flash_bytes`
+        assert CCPRxL.shape[-1] == N
+
+        max_thd = float(analyze_register_tables(CCPRxL, CCPxCON, PR2).thd.max())
+
+    return SweepResult(
+        **asdict(point),
+        valid=True,
+        PR2=PR2,
+        achieved_switching_frequency=achieved_switching_frequency,
+        switching_frequency_error=achieved_switching_frequency / point.switching_frequency - 1,
+        samples=N,
+        achieved_output_frequency=achieved_output_frequency,
+        output_frequency_error=achieved_output_frequency / point.output_frequency - 1,
+        duty_resolution_bits=configuration.resolution_bits,
+        table_flash_bytes=2 * N * len(modulation_indices),
+        compressed_table_flash_bytes=(N // 4 + -(-N // 16)) * len(modulation_indices) if N % 4 == 0 else None,
+        max_thd=max_thd
+    )
+
+
+def evaluate_points(
+        points: List[SweepPoint],
+        modulation_indices: Tuple[float, ...] = DEFAULT_MODULATION_INDICES,
+        compute_thd: bool = False
+) -> List[SweepResult]:
+    return [evaluate_point(point, modulation_indices, compute_thd) for point in points]
+
+
+def get_chunks(points: List[SweepPoint], chunk_size: int) -> Iterator[List[SweepPoint]]:
+    for start in range(0, len(points), chunk_size):
+        yield points[start:start + chunk_size]
+
+
+def get_options_path(output_path: Path) -> Path:
+    return output_path.with_name(output_path.name + '.options.json')
+
+
+def check_sweep_options(output_path: Path, options: dict):
+    """
+    Guarda junto al CSV las opciones que cambian los resultados. Si el CSV ya tiene
+    filas de otras opciones (o de antes de que se guardaran), no se puede retomar.
+    """
+    options_path = get_options_path(output_path)
+
+    has_rows = output_path.exists() and output_path.stat().st_size > 0
+
+    if has_rows:
+        saved = json.loads(options_path.read_text()) if options_path.exists() else None
+
+        if saved != options:
+            raise SweepOptionsMismatchError(f'{output_path} was computed with different options '
+                                            f'({saved} != {options}); use another output file')
+    else:
+        options_path.write_text(json.dumps(options, indent=4, sort_keys=True))
+
+
+def read_completed_points(output_path: Path) -> Set[SweepPoint]:
+    """ Puntos ya evaluados en `output_path`, para retomar un barrido interrumpido """
+    if not output_path.exists():
+        return set()
+
+    # Una interrupción puede dejar la última fila a medias: se descarta
+    content = output_path.read_bytes()
+
+    if content and not content.endswith(b'\n'):
+        output_path.write_bytes(content[:content.rfind(b'\n') + 1])
+
+    completed = set()
+
+    with open(output_path, newline='') as f:
+        for row in csv.DictReader(f):
+            try:
+                completed.add(SweepPoint(float(row['switching_frequency']),
+                                         float(row['output_frequency']),
+                                         float(row['F_osc']),
+                                         int(row['TMR2_prescaler'])))
+            except (KeyError, TypeError, ValueError):
+                continue
+
+    return completed
+
+
+def run_sweep(
+        points: Iterable[SweepPoint],
+        output_path: Path,
+        modulation_indices: Tuple[float, ...] = DEFAULT_MODULATION_INDICES,
+        compute_thd: bool = False,
+        max_workers: Optional[int] = None,
+        chunk_size: Optional[int] = None
+) -> Iterator[SweepResult]:
+    """
+    Evalúa los puntos en un pool de procesos, de a `chunk_size` por tarea (por
+    defecto unas CHUNKS_PER_WORKER tareas por proceso), y agrega los resultados de
+    cada tarea a `output_path` (CSV) apenas termina. Los puntos que ya están en el
+    archivo se omiten, así que un barrido interrumpido se retoma llamando de nuevo;
+    si `modulation_indices`, `compute_thd` o SWEEP_VERSION cambiaron, se lanza
+    SweepOptionsMismatchError.
+    """
+    output_path = Path(output_path)
+
+    check_sweep_options(output_path, {'sweep_version': SWEEP_VERSION,
+                                      'modulation_indices': list(modulation_indices),
+                                      'compute_thd': compute_thd})
+
+    completed = read_completed_points(output_path)
+    pending = [point for point in points if point not in completed]
+
+    if chunk_size is None:
+        workers = max_workers or os.cpu_count() or 1
+
+        chunk_size = min(max(1, -(-len(pending) // (CHUNKS_PER_WORKER * workers))), MAX_CHUNK_SIZE)
+
+    write_header = not output_path.exists() or output_path.stat().st_size == 0
+
+    with open(output_path, 'a', newline='') as f, ProcessPoolExecutor(max_workers=max_workers) as executor:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+
+        if write_header:
+            writer.writeheader()
+
+        futures = [executor.submit(evaluate_points, chunk, modulation_indices, compute_thd)
+                   for chunk in get_chunks(pending, chunk_size)]
+
+        for future in as_completed(futures):
+            results = future.result()
+
+            writer.writerows(asdict(result) for result in results)
+            f.flush()
+
+            yield from results
+
+
+def parse_range(text: str) -> List[float]:
+    """ 'a,b,c' o 'inicio:fin:paso' (fin incluido) """
+    if ':' in text:
+        start, stop, step = (float(value) for value in text.split(':'))
+
+        count = int(round((stop - start) / step)) + 1
+
+        return [start + i * step for i in range(count)]
+
+    return [float(value) for value in text.split(',')]
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Barrido de configuraciones de PWM para las tablas SPWM')
+    parser.add_argument('--switching', type=parse_range, default=parse_range('10e3:40e3:1e3'))
+    parser.add_argument('--output', type=parse_range, default=parse_range('50,60'))
+    parser.add_argument('--fosc', type=parse_range, default=parse_range('32e6,48e6'))
+    parser.add_argument('--prescaler', type=parse_range, default=parse_range('1,4,16'))
+    parser.add_argument('--thd', action='store_true', help='Calcula el THD de las tablas de cada punto')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=None, help='Puntos por tarea del pool')
+    parser.add_argument('-o', '--out', type=Path, default=Path('sweep.csv'))
+
+    args = parser.parse_args()
+
+    sweep_points = get_sweep_points(args.switching, args.output, args.fosc, [int(p) for p in args.prescaler])
+
+    for i, sweep_result in enumerate(run_sweep(sweep_points, args.out, compute_thd=args.thd,
+                                               max_workers=args.workers, chunk_size=args.chunk_size), start=1):
+        if sweep_result.valid:
+            print(f'[{i}] F_PWM {sweep_result.switching_frequency:.0f} Hz, F_osc {sweep_result.F_osc:.0f}, '
+                  f'prescaler {sweep_result.TMR2_prescaler}: PR2 {sweep_result.PR2}, '
+                  f'{sweep_result.duty_resolution_bits:.2f} bits')
@@ -0,0 +1,47 @@
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from serial.tools.list_ports_common import ListPortInfo
+
+
+@dataclass(frozen=True)
+class DeviceIdentity:
+    """
+    Identifica un dispositivo aunque cambie de puerto al re-enumerarse el USB (p. ej.
+    COM5 -> COM6). Sin número de serie (UART nativo, adaptadores que no lo informan)
+    solo queda el nombre del puerto.
+    """
+    port_name: str
+    serial_number: Optional[str] = None
+    vid: Optional[int] = None
+    pid: Optional[int] = None
+
+    @classmethod
+    def from_port_info(cls, port_info: ListPortInfo) -> 'DeviceIdentity':
+        return cls(
+            port_info.name,
+            getattr(port_info, 'serial_number', None),
+            getattr(port_info, 'vid', None),
+            getattr(port_info, 'pid', None)
+        )
+
+    @property
+    def has_serial_number(self) -> bool:
+        return bool(self.serial_number)
+
+    def matches(self, port_info: ListPortInfo) -> bool:
+        if self.has_serial_number:
+            return (port_info.serial_number, port_info.vid, port_info.pid) == (self.serial_number, self.vid, self.pid)
+
+        return port_info.name == self.port_name
+
+
+def find_device_port(identity: DeviceIdentity, port_infos: Iterable[ListPortInfo]) -> Optional[ListPortInfo]:
+    """ Puerto donde está ahora el dispositivo; si hay varios candidatos, se prefiere el puerto anterior """
+    candidates = [port_info for port_info in port_infos if identity.matches(port_info)]
+
+    for port_info in candidates:
+        if port_info.name == identity.port_name:
+            return port_info
+
+    return candidates[0] if candidates else None
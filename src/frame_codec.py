@@ -0,0 +1,289 @@
+from dataclasses import dataclass
+from enum import Enum
+from typing import Container, Iterator, Optional
+
+
+# Trama: [largo, tipo, datos..., CRC opcional]; el largo cuenta tipo + datos
+MAX_FRAME_LENGTH = 0xFF
+
+
+class ChecksumType(Enum):
+    NONE = 0
+    CRC8 = 1  # Polinomio 0x07, valor inicial 0x00
+    CRC16 = 2  # CRC-16/CCITT-FALSE: polinomio 0x1021, valor inicial 0xFFFF, big endian
+
+    @property
+    def size(self) -> int:
+        return self.value
+
+
+def _get_crc8_table() -> bytes:
+    table = bytearray(256)
+
+    for byte in range(256):
+        crc = byte
+
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07 if crc & 0x80 else crc << 1) & 0xFF
+
+        table[byte] = crc
+
+    return bytes(table)
+
+
+def _get_crc16_table() -> tuple:
+    table = []
+
+    for byte in range(256):
+        crc = byte << 8
+
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1) & 0xFFFF
+
+        table.append(crc)
+
+    return tuple(table)
+
+
+CRC8_TABLE = _get_crc8_table()
+CRC16_TABLE = _get_crc16_table()
+
+
+def crc8(data) -> int:
+    crc = 0
+
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+
+    return crc
+
+
+def crc16(data) -> int:
+    crc = 0xFFFF
+
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ CRC16_TABLE[(crc >> 8) ^ byte]
+
+    return crc
+
+
+def get_checksum(checksum: ChecksumType, data) -> bytes:
+    if checksum == ChecksumType.CRC8:
+        return bytes([crc8(data)])
+
+    if checksum == ChecksumType.CRC16:
+        return crc16(data).to_bytes(2, 'big')
+
+    return b''
+
+
+def get_max_frame_size(checksum: ChecksumType = ChecksumType.NONE) -> int:
+    return 1 + MAX_FRAME_LENGTH + checksum.size
+
+
+@dataclass(frozen=True)
+class Frame:
+    """ `payload` apunta al buffer del parser: es válido hasta la siguiente lectura """
+    msg_type: int
+    payload: memoryview
+
+
+class FrameEncoder:
+    """ Arma las tramas sobre un buffer que se reutiliza en cada mensaje """
+
+    def __init__(self, checksum: ChecksumType = ChecksumType.NONE):
+        self.checksum = checksum
+
+        self._buffer = bytearray(get_max_frame_size(checksum))
+        self._view = memoryview(self._buffer)
+
+    def encode(self, msg_type: int, payload=b'') -> memoryview:
+        """ Trama lista para escribir; es válida hasta el siguiente encode """
+        length = 1 + len(payload)
+
+        if length > MAX_FRAME_LENGTH:
+            raise ValueError(f'Payload too long for a frame ({len(payload)} bytes)')
+
+        self._buffer[0] = length
+        self._buffer[1] = msg_type
+        self._buffer[2:2 + len(payload)] = payload
+
+        end = 1 + length
+
+        if self.checksum != ChecksumType.NONE:
+            checksum = get_checksum(self.checksum, self._view[:end])
+
+            self._buffer[end:end + len(checksum)] = checksum
+
+            end += len(checksum)
+
+        return self._view[:end]
+
+
+def encode_frame(msg_type: int, payload=b'', checksum: ChecksumType = ChecksumType.NONE) -> bytes:
+    """ Versión que entrega una copia, para mensajes sueltos """
+    return bytes(FrameEncoder(checksum).encode(msg_type, payload))
+
+
+class FrameParser:
+    """
+    Parser incremental: acepta trozos de cualquier tamaño en un buffer preasignado y
+    entrega las tramas completas como vistas sobre ese buffer, sin copiarlas. Ante
+    una trama inválida (CRC incorrecto, largo cero o tipo desconocido) descarta un
+    byte y vuelve a buscar el inicio de una trama.
+    """
+
+    def __init__(self, checksum: ChecksumType = ChecksumType.NONE, buffer_size: int = 4096,
+                 valid_types: Optional[Container[int]] = None):
+        if buffer_size < 2 * get_max_frame_size(checksum):
+            raise ValueError('Parser buffer must hold at least two maximum-size frames')
+
+        self.checksum = checksum
+        self.valid_types = valid_types
+
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+
+        self._start = 0  # Primer byte sin procesar
+        self._end = 0  # Fin de los datos recibidos
+
+        self.frames_parsed = 0
+        self.checksum_errors = 0
+        self.bytes_discarded = 0
+
+    @property
+    def buffered(self) -> int:
+        return self._end - self._start
+
+    def clear(self):
+        self._start = self._end = 0
+
+    def _compact(self):
+        if self._start:
+            remaining = self._end - self._start
+
+            self._buffer[:remaining] = self._view[self._start:self._end]
+
+            self._start, self._end = 0, remaining
+
+    def get_write_view(self, size: Optional[int] = None) -> memoryview:
+        """
+        Espacio libre del buffer, para leer directamente en él (p. ej. con
+        `Serial.readinto`); después se llama a `commit` con los bytes escritos.
+        """
+        if size is None or self._end + size > len(self._buffer):
+            self._compact()
+
+        free = len(self._buffer) - self._end
+
+        return self._view[self._end:self._end + (free if size is None else min(size, free))]
+
+    def commit(self, n: int):
+        self._end += n
+
+    def feed(self, data) -> int:
+        """ Copia `data` al buffer; entrega cuántos bytes cupieron """
+        view = self.get_write_view(len(data))
+
+        n = len(view)
+        view[:] = memoryview(data)[:n]
+
+        self.commit(n)
+
+        return n
+
+    def _discard(self):
+        self._start += 1
+        self.bytes_discarded += 1
+
+    def frames(self) -> Iterator[Frame]:
+        """ Tramas completas en el buffer; las vistas anteriores se invalidan al leer más datos """
+        checksum_size = self.checksum.size
+
+        while self._end - self._start >= 2:
+            length = self._buffer[self._start]
+            msg_type = self._buffer[self._start + 1]
+
+            if length == 0 or (self.valid_types is not None and msg_type not in self.valid_types):
+                self._discard()
+
+                continue
+
+            frame_end = self._start + 1 + length
+
+            if frame_end + checksum_size > self._end:
+                return
+
+            if checksum_size:
+                expected = get_checksum(self.checksum, self._view[self._start:frame_end])
+
+                if self._view[frame_end:frame_end + checksum_size] != expected:
+                    self.checksum_errors += 1
+                    self._discard()
+
+                    continue
+
+            frame = Frame(msg_type, self._view[self._start + 2:frame_end])
+
+            self._start = frame_end + checksum_size
+            self.frames_parsed += 1
+
+            yield frame
+
+
+if __name__ == "__main__":
+    from random import Random
+    from time import perf_counter
+
+    frame_count = 100_000
+
+    for checksum in ChecksumType:
+        encoder = FrameEncoder(checksum)
+
+        start = perf_counter()
+
+        for i in range(frame_count):
+            encoder.encode(4, (i & 0xFF,))
+
+        encode_time = perf_counter() - start
+
+        stream = b''.join(encode_frame(4, (i & 0xFF,), checksum) for i in range(frame_count))
+
+        for chunk_size in (1, 16, 256, 4096):
+            parser = FrameParser(checksum, buffer_size=8192)
+
+            parsed = 0
+            start = perf_counter()
+
+            for offset in range(0, len(stream), chunk_size):
+                parser.feed(stream[offset:offset + chunk_size])
+
+                for _ in parser.frames():
+                    parsed += 1
+
+            parse_time = perf_counter() - start
+
+            assert parsed == frame_count
+
+            print(f'{checksum.name:5s}, trozos de {chunk_size:4d} B: '
+                  f'{frame_count / parse_time / 1e3:7.1f} ktramas/s al parsear, '
+                  f'{frame_count / encode_time / 1e3:7.1f} ktramas/s al codificar')
+
+    # Resincronización: un byte alterado cada tanto no debe perder más que esa trama
+    rng = Random(0)
+
+    stream = bytearray(b''.join(encode_frame(4, (i & 0xFF, 0x55), ChecksumType.CRC16) for i in range(1000)))
+
+    for offset in rng.sample(range(len(stream)), 20):
+        stream[offset] ^= 0x5A
+
+    parser = FrameParser(ChecksumType.CRC16, valid_types=range(1, 10))
+
+    parsed = 0
+    offset = 0
+
+    while offset < len(stream):
+        offset += parser.feed(stream[offset:offset + rng.randint(1, 64)])
+        parsed += sum(1 for _ in parser.frames())
+
+    print(f'Con 20 bytes alterados: {parsed} de 1000 tramas, {parser.checksum_errors} errores de CRC')
@@ -0,0 +1,122 @@
+from collections import Counter
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional
+
+import trio
+
+from serial.tools.list_ports_common import ListPortInfo
+
+from device_identity import DeviceIdentity
+from serial_communication import SerialPort, SerialPortStatus
+from trio_bridge import TrioBridge, call, get_result
+
+
+@dataclass(frozen=True)
+class InverterManagerStatus:
+    statuses: Dict[str, SerialPortStatus]
+
+    @property
+    def connected(self) -> int:
+        return sum(status == SerialPortStatus.CONNECTED for status in self.statuses.values())
+
+    @property
+    def counts(self) -> Dict[SerialPortStatus, int]:
+        return dict(Counter(self.statuses.values()))
+
+    @property
+    def all_connected(self) -> bool:
+        return bool(self.statuses) and self.connected == len(self.statuses)
+
+
+class InverterManager:
+    """
+    Varios inversores, un SerialPort por puerto, todos sobre el mismo loop de trio.
+    Cada sesión tiene su propia tarea de envío, así que un índice para N
+    dispositivos cuesta alrededor de un round trip y no N seguidos. Los argumentos
+    extra se pasan a cada SerialPort (baudrate, timeout, window, ...).
+    """
+
+    def __init__(self, dispatch: Callable[[Callable[[], None]], None] = call, **port_options):
+        self.bridge = TrioBridge(dispatch)
+        self.port_options = port_options
+
+        self.ports: Dict[str, SerialPort] = {}
+
+    def _get_port(self, port_name: str) -> SerialPort:
+        if port_name not in self.ports:
+            self.ports[port_name] = SerialPort(bridge=self.bridge, **self.port_options)
+
+        return self.ports[port_name]
+
+    async def _connect_all(self, devices: Iterable[DeviceIdentity]) -> Dict[str, Optional[float]]:
+        results: Dict[str, Optional[float]] = {}
+
+        async def connect(port: SerialPort, device: DeviceIdentity):
+            results[device.port_name] = await port.async_connect(device.port_name, device)
+
+        async with trio.open_nursery() as nursery:
+            for device in devices:
+                nursery.start_soon(connect, self._get_port(device.port_name), device)
+
+        return results
+
+    def connect(self, port_infos: Iterable[ListPortInfo],
+                callback: Optional[Callable[[Dict[str, Optional[float]]], None]] = None) -> Future:
+        """
+        Conecta todos los puertos a la vez. El resultado es el índice de modulación de
+        cada dispositivo, o None para los que no respondieron.
+        """
+        devices = [DeviceIdentity.from_port_info(port_info) for port_info in port_infos]
+
+        for device in devices:
+            self._get_port(device.port_name).status = SerialPortStatus.CONNECTING
+
+        # Si falla algo inesperado, `callback` recibe None para todos (el error queda en el Future)
+        failed = dict.fromkeys(device.port_name for device in devices)
+
+        return self.bridge.submit(self._connect_all, devices,
+                                  callback=None if callback is None else lambda future: callback(get_result(future, failed)))
+
+    def sync(self, modulation_indices: Dict[str, float]):
+        """ Índice de modulación por dispositivo, sin esperar (ver SerialPort.sync) """
+        for port_name, modulation_index in modulation_indices.items():
+            self.ports[port_name].sync(modulation_index)
+
+    def broadcast(self, modulation_index: float):
+        self.sync({port_name: modulation_index for port_name in self.ports})
+
+    async def _sync_all(self, modulation_indices: Dict[str, float], timeout: Optional[float]) -> Dict[str, bool]:
+        results: Dict[str, bool] = {}
+
+        async def sync(port_name: str, modulation_index: float):
+            results[port_name] = await self.ports[port_name].async_sync(modulation_index, timeout)
+
+        async with trio.open_nursery() as nursery:
+            for port_name, modulation_index in modulation_indices.items():
+                nursery.start_soon(sync, port_name, modulation_index)
+
+        return results
+
+    def sync_and_wait(self, modulation_indices: Dict[str, float], timeout: Optional[float] = None) -> Future:
+        """ Como `sync`, pero el Future entrega, por dispositivo, si el dispositivo confirmó el índice antes de `timeout` """
+        return self.bridge.submit(self._sync_all, dict(modulation_indices), timeout)
+
+    def broadcast_and_wait(self, modulation_index: float, timeout: Optional[float] = None) -> Future:
+        return self.sync_and_wait({port_name: modulation_index for port_name in self.ports}, timeout)
+
+    @property
+    def status(self) -> InverterManagerStatus:
+        return InverterManagerStatus({port_name: port.status for port_name, port in self.ports.items()})
+
+    async def _exit_all(self):
+        async with trio.open_nursery() as nursery:
+            for port in self.ports.values():
+                nursery.start_soon(port.async_exit)
+
+    def exit(self) -> Future:
+        """ Desconecta todos los dispositivos a la vez """
+        return self.bridge.submit(self._exit_all)
+
+    def close(self):
+        self.bridge.close()
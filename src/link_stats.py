@@ -0,0 +1,192 @@
+import json
+
+from dataclasses import asdict, dataclass
+from math import log, sqrt
+from pathlib import Path
+from time import monotonic, time
+from typing import Dict, List, Optional, Union
+
+
+# Buckets logarítmicos de 10 us a 10 s: cada uno cubre ~19 %, suficiente para p50/p95/p99
+HISTOGRAM_MIN = 1e-5
+HISTOGRAM_MAX = 10.0
+HISTOGRAM_BUCKETS = 80
+
+_BUCKET_RATIO = (HISTOGRAM_MAX / HISTOGRAM_MIN) ** (1 / HISTOGRAM_BUCKETS)
+_LOG_BUCKET_RATIO = log(_BUCKET_RATIO)
+
+
+@dataclass(frozen=True)
+class RttSummary:
+    """ Tiempos de ida y vuelta, en segundos """
+    count: int
+    mean: float
+    min: float
+    max: float
+    p50: float
+    p95: float
+    p99: float
+
+
+class RttHistogram:
+    """
+    Histograma de tamaño fijo: registrar una muestra es O(1) y no reserva memoria.
+    Los percentiles tienen la resolución de un bucket.
+    """
+
+    def __init__(self):
+        # Un bucket extra a cada lado para lo que cae fuera del rango
+        self.counts: List[int] = [0] * (HISTOGRAM_BUCKETS + 2)
+
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        if seconds < HISTOGRAM_MIN:
+            bucket = 0
+        elif seconds >= HISTOGRAM_MAX:
+            bucket = HISTOGRAM_BUCKETS + 1
+        else:
+            bucket = 1 + int(log(seconds / HISTOGRAM_MIN) / _LOG_BUCKET_RATIO)
+
+        self.counts[bucket] += 1
+
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def get_percentile(self, percentile: float, counts: Optional[List[int]] = None) -> float:
+        counts = self.counts if counts is None else counts
+        count = sum(counts)
+
+        if not count:
+            return 0.0
+
+        target = percentile / 100 * count
+        cumulative = 0
+
+        for bucket, bucket_count in enumerate(counts):
+            cumulative += bucket_count
+
+            if cumulative >= target:
+                break
+
+        if bucket == 0:
+            return self.min
+
+        if bucket == HISTOGRAM_BUCKETS + 1:
+            return self.max
+
+        # Centro geométrico del bucket, acotado a lo observado
+        lower = HISTOGRAM_MIN * _BUCKET_RATIO ** (bucket - 1)
+
+        return min(max(lower * sqrt(_BUCKET_RATIO), self.min), self.max)
+
+    def get_summary(self) -> RttSummary:
+        # Copia para que una muestra nueva a mitad de camino no mezcle estados
+        counts = list(self.counts)
+
+        return RttSummary(
+            count=self.count,
+            mean=self.total / self.count if self.count else 0.0,
+            min=self.min if self.count else 0.0,
+            max=self.max,
+            p50=self.get_percentile(50, counts),
+            p95=self.get_percentile(95, counts),
+            p99=self.get_percentile(99, counts)
+        )
+
+
+@dataclass(frozen=True)
+class LinkStatsSnapshot:
+    timestamp: float  # time.time()
+    connected: bool
+    uptime: float  # Segundos de la sesión actual
+    sessions: int
+    rtt: Dict[str, RttSummary]
+    rto: float  # Plazo de respuesta actual
+    retries: int  # Reenvíos en modo pregunta/respuesta
+    retransmissions: int  # Reenvíos en modo con ventana
+    timeouts: int
+    checksum_errors: int
+    bytes_in: int
+    bytes_out: int
+    frames_in: int
+    frames_out: int
+    last_disconnect_reason: Optional[str]
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class LinkStats:
+    """
+    Contadores del enlace. Solo los actualiza el loop de trio; `snapshot` se puede
+    leer desde cualquier hilo sin bloquear el enlace.
+    """
+
+    def __init__(self):
+        self.rtt: Dict[str, RttHistogram] = {}
+        self.rto = 0.0
+
+        self.sessions = 0
+        self.session_start: Optional[float] = None
+
+        self.retries = 0
+        self.retransmissions = 0
+        self.timeouts = 0
+        self.checksum_errors = 0
+
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.frames_in = 0
+        self.frames_out = 0
+
+        self.last_disconnect_reason: Optional[str] = None
+
+    def record_rtt(self, msg_type: str, seconds: float):
+        histogram = self.rtt.get(msg_type)
+
+        if histogram is None:
+            histogram = self.rtt[msg_type] = RttHistogram()
+
+        histogram.record(seconds)
+
+    def session_started(self):
+        self.sessions += 1
+        self.session_start = monotonic()
+
+    def session_ended(self, reason: Optional[str] = None):
+        self.session_start = None
+
+        if reason is not None:
+            self.last_disconnect_reason = reason
+
+    def snapshot(self) -> LinkStatsSnapshot:
+        session_start = self.session_start
+
+        return LinkStatsSnapshot(
+            timestamp=time(),
+            connected=session_start is not None,
+            uptime=0.0 if session_start is None else monotonic() - session_start,
+            sessions=self.sessions,
+            rtt={msg_type: histogram.get_summary() for msg_type, histogram in list(self.rtt.items())},
+            rto=self.rto,
+            retries=self.retries,
+            retransmissions=self.retransmissions,
+            timeouts=self.timeouts,
+            checksum_errors=self.checksum_errors,
+            bytes_in=self.bytes_in,
+            bytes_out=self.bytes_out,
+            frames_in=self.frames_in,
+            frames_out=self.frames_out,
+            last_disconnect_reason=self.last_disconnect_reason
+        )
+
+
+def append_json_line(path: Union[str, Path], record: dict):
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
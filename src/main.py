@@ -1,3 +1,5 @@
+from typing import List, Optional
+
 from kivy.app import App
 from kivy.clock import Clock
 from kivy.properties import BoundedNumericProperty, ObjectProperty, NumericProperty
@@ -7,11 +9,12 @@ from kivy.uix.floatlayout import FloatLayout
 from kivy.lang.builder import Builder
 from kivy.logger import Logger
 
-from serial.tools.list_ports import comports
 from serial.tools.list_ports_common import ListPortInfo
 
 from constants import PICValues
+from port_watcher import PortEvent, PortWatcher
 from serial_communication import SerialPortStatus, SerialPort
+from trio_bridge import TrioBridge
 
 
 class DeviceButton(Button):
@@ -47,11 +50,16 @@ class InverterGUI(FloatLayout):
         self._device_selection_button.bind(on_release=self.on_device_selection_released)
         self._disconnect_device_button.bind(on_release=self.disconnect_device)
 
-        self.connected_devices = []
+        # Los resultados del puerto llegan desde el hilo de trio; se pasan al hilo de Kivy
+        self.bridge = TrioBridge(dispatch=lambda callback: Clock.schedule_once(lambda _: callback()))
+
+        # Lista de dispositivos abierta, para actualizarla si cambian los puertos
+        self._device_menu: Optional[DropDown] = None
 
-        Clock.schedule_interval(self.detect_connected_devices, 0.15)
+        # Los puertos se enumeran en segundo plano; la lista de dispositivos lee la última enumeración
+        self.port_watcher = PortWatcher(self.bridge, on_change=self.on_ports_changed)
 
-        self.serial_port = SerialPort()
+        self.serial_port = SerialPort(bridge=self.bridge, port_watcher=self.port_watcher)
         self.ready = False
 
         Clock.schedule_interval(self.sync_device, 0.05)
@@ -73,6 +81,9 @@ class InverterGUI(FloatLayout):
             self.set_bar_to_error(f'El dispositivo excedió el tiempo de espera.')
 
             self.ready = False
+        elif self.serial_port.status == SerialPortStatus.RECONNECTING:
+            # Se mantiene `ready`: al reconectarse se sigue enviando el índice de la GUI
+            self.set_bar_to_error(f'Se perdió la conexión, reconectando a {self.serial_port.device.port_name}...')
         elif self.serial_port.status == SerialPortStatus.COULD_NOT_CONNECT_ERROR:
             self.set_bar_to_error(f'No se pudo conectar al dispositivo.')
 
@@ -105,13 +116,27 @@ class InverterGUI(FloatLayout):
         self.frequency = frequency
 
     def on_device_selection_released(self, *_):
+        # La lista se abre con la última enumeración; si el escaneo pedido aquí encuentra
+        # cambios, on_ports_changed la actualiza mientras sigue abierta
+        self.port_watcher.rescan()
+
         drop_down_menu = DropDown()
+        drop_down_menu.bind(on_dismiss=self.on_device_menu_dismissed)
         drop_down_menu.open(self._device_selection_button)
 
+        self._device_menu = drop_down_menu
+
+        self.fill_device_menu(drop_down_menu)
+
+    def on_device_menu_dismissed(self, drop_down_menu: DropDown):
+        if self._device_menu is drop_down_menu:
+            self._device_menu = None
+
+    def fill_device_menu(self, drop_down_menu: DropDown):
         drop_down_menu.clear_widgets()
 
         # Por cada dispositivo conectado, crea un botón
-        for device in self.connected_devices:
+        for device in self.port_watcher.ports:
             new_button = DeviceButton(size_hint_y=None,
                                       text=device.name,
                                       device=device)
@@ -138,25 +163,29 @@ class InverterGUI(FloatLayout):
 
         self.duty_cycle = duty_cycle
 
-    def detect_connected_devices(self, *_):
-        self.connected_devices = comports()
+    def on_ports_changed(self, events: List[PortEvent]):
+        for event in events:
+            Logger.info(f'Puertos: {event.type.name} {event.port_info.name}')
+
+        if self._device_menu is not None:
+            self.fill_device_menu(self._device_menu)
 
     def connect_to_device(self, port_info: ListPortInfo):
         """ En base al nombre de dispositivo, intentar conectarse al dispositivo... """
 
-        # connection_result = self.serial_comm.connect(port_info)
         self._status_label.text = f'Conectando a {port_info.name}...'
 
-        connection_result = self.serial_port.connect(port_info)
+        # No bloquea: el resultado llega a on_device_connected
+        self.serial_port.connect(port_info, callback=self.on_device_connected)
 
-        if connection_result is None:
+    def on_device_connected(self, modulation_index: Optional[float]):
+        if modulation_index is None:
             return
 
-        self.modulation_index = connection_result
+        self.modulation_index = modulation_index
 
         self.ready = True
 
-
     def disconnect_device(self, *_):
         self.serial_port.exit()
 
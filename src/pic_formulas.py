@@ -1,5 +1,7 @@
 from typing import Tuple, List
 
+from pwm_frequency_index import MAX_PR2, get_pwm_frequency_index
+
 
 def getPR2value(PWM_freq: float, F_osc: float, TMR2_prescaler: int) -> float:
     """
@@ -15,12 +17,14 @@ def get_freq_from_PR2(PR2: int, F_osc: float, TMR2_prescaler: int) -> float:
 
 
 def possiblePR2values(F_osc: float, TMR2_prescaler: int) -> List[Tuple[int, float]]:
-    return [(PR2, F_osc / ((PR2 + 1) * 4 * TMR2_prescaler)) for PR2 in range(255)]
+    """ Pares (PR2, frecuencia) de 0 a MAX_PR2, tomados del índice de frecuencias """
+    index = get_pwm_frequency_index(F_osc, (TMR2_prescaler,))
 
+    # El índice está ordenado por frecuencia, es decir, por PR2 descendente
+    return [(int(PR2), float(frequency)) for PR2, frequency in zip(index.PR2[::-1], index.frequencies[::-1])]
 
-def max_possible_PR2_value(F_osc: float, TMR2_prescaler: int) -> int:
-    MAX_PR2 = 255
 
+def max_possible_PR2_value(F_osc: float, TMR2_prescaler: int) -> int:
     return int(F_osc / ((MAX_PR2 + 1) * 4 * TMR2_prescaler))
 
 
@@ -29,11 +33,37 @@ def get_duty_cycle_from_CCPRxL_CCPxCON(CCPRxL: int, CCPxCON: int, PR2: int):
     return ((CCPRxL << 2) | ((CCPxCON >> 4) & 0b11)) / (4 * (PR2 + 1))
 
 
+def get_baud_rate_divider(SYNC: bool = False, BRG16: bool = False, BRGH: bool = False) -> int:
+    """ Divisor de F_osc / (SPBRGH:SPBRGL + 1) según la configuración del EUSART """
+    if SYNC:
+        return 4
+
+    if BRG16 and BRGH:
+        return 4
+
+    if BRG16 or BRGH:
+        return 16
+
+    return 64
+
+
+def get_max_SPBRG_value(BRG16: bool = False) -> int:
+    return 0xFFFF if BRG16 else 0xFF
+
+
 def getSPBRGH_SPBRGL(F_osc: int, baudrate: int, SYNC: bool = False, BRG16: bool = False, BRGH: bool = False) -> int:
-    if not SYNC and not BRG16 and not BRGH:
-        return int(F_osc / baudrate/ 64) - 1
-    else:
-        raise NotImplementedError
+    # Latex: \text{SPBRGH:SPBRGL} = \frac{F_{\text{osc}}}{\text{baudrate} \cdot n} - 1
+    SPBRG = int(F_osc / baudrate / get_baud_rate_divider(SYNC, BRG16, BRGH)) - 1
+
+    if not 0 <= SPBRG <= get_max_SPBRG_value(BRG16):
+        raise ValueError(f'Baud rate {baudrate} is not reachable with SYNC={SYNC:d}, BRG16={BRG16:d}, BRGH={BRGH:d}')
+
+    return SPBRG
+
+
+def get_baud_rate_from_SPBRG(F_osc: float, SPBRG: int, SYNC: bool = False, BRG16: bool = False,
+                             BRGH: bool = False) -> float:
+    return F_osc / (get_baud_rate_divider(SYNC, BRG16, BRGH) * (SPBRG + 1))
 
 
 def getCCPRxL_CCPxCON(PR2_value, dutyCycle: float) -> Tuple[int, int]:
@@ -0,0 +1,124 @@
+from dataclasses import dataclass
+from enum import Enum, auto
+from typing import Callable, Dict, List, Optional, Tuple
+
+import trio
+
+from serial.tools.list_ports import comports
+from serial.tools.list_ports_common import ListPortInfo
+
+from trio_bridge import TrioBridge
+
+
+# Cada escaneo sin cambios duplica la espera hasta el siguiente, hasta MAX_SCAN_INTERVAL
+MIN_SCAN_INTERVAL = 0.25
+MAX_SCAN_INTERVAL = 4.0
+
+
+class PortEventType(Enum):
+    ADDED = auto()
+    REMOVED = auto()
+
+
+@dataclass(frozen=True)
+class PortEvent:
+    type: PortEventType
+    port_info: ListPortInfo
+
+
+def get_port_key(port_info: ListPortInfo) -> Tuple[str, str]:
+    # Con el hwid, otro dispositivo en el mismo puerto cuenta como quitar y agregar
+    return port_info.device, port_info.hwid
+
+
+def get_port_events(previous: Dict[Tuple[str, str], ListPortInfo],
+                    current: Dict[Tuple[str, str], ListPortInfo]) -> List[PortEvent]:
+    events = [PortEvent(PortEventType.REMOVED, port_info)
+              for key, port_info in previous.items() if key not in current]
+
+    events += [PortEvent(PortEventType.ADDED, port_info)
+               for key, port_info in current.items() if key not in previous]
+
+    return events
+
+
+class PortWatcher:
+    """
+    Enumera los puertos seriales en el loop de trio de `bridge` (comports() corre en un
+    hilo de trio), fuera del hilo de la GUI. Guarda la última enumeración en `ports`
+    y, si cambió, llama a `on_change` con los eventos a través del dispatch del
+    bridge. Mientras no haya cambios la espera entre escaneos crece; `rescan` pide un
+    escaneo inmediato (p. ej. al abrir la lista de dispositivos).
+
+    La primera enumeración también corre en el loop de trio: hasta que termine `ports`
+    está vacío, y sus puertos llegan a `on_change` como ADDED.
+    """
+
+    def __init__(self, bridge: TrioBridge, on_change: Optional[Callable[[List[PortEvent]], None]] = None,
+                 min_interval: float = MIN_SCAN_INTERVAL, max_interval: float = MAX_SCAN_INTERVAL,
+                 enumerate_ports: Callable[[], List[ListPortInfo]] = comports):
+        self.bridge = bridge
+        self.on_change = on_change
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+        self._enumerate_ports = enumerate_ports
+
+        self._ports: Dict[Tuple[str, str], ListPortInfo] = {}
+
+        self.scans = 0
+
+        self._wakeup: Optional[trio.Event] = None
+        self._cancel_scope: Optional[trio.CancelScope] = None
+
+        self.bridge.submit(self._run)
+
+    @property
+    def ports(self) -> Tuple[ListPortInfo, ...]:
+        """ Puertos de la última enumeración; se puede leer desde cualquier hilo """
+        return tuple(self._ports.values())
+
+    def _scan(self) -> List[PortEvent]:
+        current = {get_port_key(port_info): port_info for port_info in self._enumerate_ports()}
+
+        events = get_port_events(self._ports, current)
+
+        # Se reemplaza el dict completo: quien lea `ports` ve la enumeración anterior o la nueva
+        self._ports = current
+        self.scans += 1
+
+        return events
+
+    async def _run(self):
+        interval = self.min_interval
+
+        with trio.CancelScope() as self._cancel_scope:
+            while True:
+                # Antes de escanear: un `rescan` pedido durante el escaneo repite el escaneo
+                self._wakeup = trio.Event()
+
+                events = await trio.to_thread.run_sync(self._scan)
+
+                if events:
+                    interval = self.min_interval
+
+                    if self.on_change is not None:
+                        self.bridge.dispatch(lambda events=events: self.on_change(events))
+                else:
+                    interval = min(2 * interval, self.max_interval)
+
+                with trio.move_on_after(interval):
+                    await self._wakeup.wait()
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def rescan(self):
+        """ Escaneo inmediato, sin esperar el resultado; se puede llamar desde cualquier hilo """
+        self.bridge.call_soon(self._wake)
+
+    def close(self):
+        if self._cancel_scope is not None:
+            self.bridge.call_soon(self._cancel_scope.cancel)
@@ -0,0 +1,193 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable, Tuple
+
+import numpy as np
+
+
+# Opciones del prescaler del TMR2 en el PIC18
+TMR2_PRESCALERS = (1, 4, 16)
+
+MAX_PR2 = 255
+
+
+@dataclass(frozen=True)
+class PwmConfiguration:
+    frequency: float
+    PR2: int
+    TMR2_prescaler: int
+    resolution_bits: float
+
+
+@dataclass(frozen=True)
+class PwmFrequencyIndex:
+    """
+    Todas las combinaciones (prescaler, PR2) alcanzables con un F_osc, ordenadas por
+    frecuencia. Si dos combinaciones dan la misma frecuencia queda primero la de más
+    resolución, que es la que se prefiere.
+    """
+    F_osc: float
+    frequencies: np.ndarray
+    PR2: np.ndarray
+    TMR2_prescalers: np.ndarray
+    resolution_bits: np.ndarray  # log2(4 * (PR2 + 1))
+    prescaler_positions: Tuple[np.ndarray, ...]  # Posiciones de cada prescaler, también ordenadas por frecuencia
+
+    def __len__(self) -> int:
+        return len(self.frequencies)
+
+    def get_configuration(self, i: int) -> PwmConfiguration:
+        return PwmConfiguration(frequency=float(self.frequencies[i]),
+                                PR2=int(self.PR2[i]),
+                                TMR2_prescaler=int(self.TMR2_prescalers[i]),
+                                resolution_bits=float(self.resolution_bits[i]))
+
+    def get_nearest_indices(self, targets) -> np.ndarray:
+        """ Posición en el índice de la frecuencia alcanzable más cercana a cada objetivo """
+        targets = np.asarray(targets, dtype=float)
+
+        right = np.clip(np.searchsorted(self.frequencies, targets), 1, len(self) - 1)
+        left = right - 1
+
+        # En un empate se elige la frecuencia menor
+        nearest = np.where(targets - self.frequencies[left] <= self.frequencies[right] - targets, left, right)
+
+        # Retrocede al primer elemento con la misma frecuencia, el de más resolución
+        return np.searchsorted(self.frequencies, self.frequencies[nearest])
+
+    def nearest(self, target: float) -> PwmConfiguration:
+        return self.get_configuration(int(self.get_nearest_indices(target)))
+
+    def get_tolerance_bounds(self, targets, tolerance: float) -> Tuple[np.ndarray, np.ndarray]:
+        """ Rango [inicio, fin) del índice con las frecuencias a menos de `tolerance` (relativo) de cada objetivo """
+        targets = np.asarray(targets, dtype=float)
+
+        start = np.searchsorted(self.frequencies, targets * (1 - tolerance), side='left')
+        stop = np.searchsorted(self.frequencies, targets * (1 + tolerance), side='right')
+
+        return start, stop
+
+    def within(self, target: float, tolerance: float) -> Tuple[PwmConfiguration, ...]:
+        start, stop = self.get_tolerance_bounds(target, tolerance)
+
+        return tuple(self.get_configuration(i) for i in range(int(start), int(stop)))
+
+    def get_max_resolution_indices(self, targets, tolerance: float) -> np.ndarray:
+        """
+        Posición de la combinación de más resolución a menos de `tolerance` de cada
+        objetivo, o -1 si no hay ninguna.
+        """
+        targets = np.asarray(targets, dtype=float)
+
+        indices = np.full(targets.shape, -1, dtype=np.int64)
+        best = np.full(targets.shape, -np.inf)
+
+        # Con un mismo prescaler la resolución crece al bajar la frecuencia, así que el
+        # mejor candidato de cada prescaler es su frecuencia más baja dentro del rango
+        for positions in self.prescaler_positions:
+            frequencies = self.frequencies[positions]
+
+            lowest = np.searchsorted(frequencies, targets * (1 - tolerance), side='left')
+            candidates = positions[np.minimum(lowest, len(positions) - 1)]
+
+            in_range = (lowest < len(positions)) & (self.frequencies[candidates] <= targets * (1 + tolerance))
+            better = in_range & (self.resolution_bits[candidates] > best)
+
+            indices = np.where(better, candidates, indices)
+            best = np.where(better, self.resolution_bits[candidates], best)
+
+        return indices
+
+    def max_resolution(self, target: float, tolerance: float) -> PwmConfiguration:
+        i = int(self.get_max_resolution_indices(target, tolerance))
+
+        if i < 0:
+            raise ValueError(f'No achievable PWM frequency within {100 * tolerance:g} % of {target:g} Hz')
+
+        return self.get_configuration(i)
+
+    def snap_range(self, min_frequency: float, max_frequency: float) -> Tuple[float, float]:
+        """ Frecuencias alcanzables extremas dentro de [min_frequency, max_frequency] """
+        start = np.searchsorted(self.frequencies, min_frequency, side='left')
+        stop = np.searchsorted(self.frequencies, max_frequency, side='right')
+
+        if start >= stop:
+            raise ValueError(f'No achievable PWM frequency between {min_frequency:g} Hz and {max_frequency:g} Hz')
+
+        return float(self.frequencies[start]), float(self.frequencies[stop - 1])
+
+
+@lru_cache(maxsize=None)
+def _build_pwm_frequency_index(F_osc: float, TMR2_prescalers: Tuple[int, ...]) -> PwmFrequencyIndex:
+    PR2 = np.tile(np.arange(MAX_PR2 + 1), len(TMR2_prescalers))
+    prescalers = np.repeat(np.asarray(TMR2_prescalers), MAX_PR2 + 1)
+
+    frequencies = F_osc / ((PR2 + 1) * 4 * prescalers)
+    resolution_bits = np.log2(4 * (PR2 + 1))
+
+    order = np.lexsort((-resolution_bits, frequencies))
+
+    arrays = [frequencies[order], PR2[order], prescalers[order], resolution_bits[order]]
+
+    prescaler_positions = tuple(np.flatnonzero(arrays[2] == prescaler) for prescaler in TMR2_prescalers)
+
+    for array in arrays + list(prescaler_positions):
+        array.flags.writeable = False
+
+    return PwmFrequencyIndex(F_osc, *arrays, prescaler_positions)
+
+
+def get_pwm_frequency_index(F_osc: float, TMR2_prescalers: Iterable[int] = TMR2_PRESCALERS) -> PwmFrequencyIndex:
+    """ Índice de frecuencias para `F_osc`; se construye la primera vez y después se reutiliza """
+    return _build_pwm_frequency_index(float(F_osc), tuple(sorted(set(TMR2_prescalers))))
+
+
+def get_pwm_configuration(switching_frequency: float, F_osc: float, TMR2_prescaler: int) -> PwmConfiguration:
+    """
+    Combinación con PR2 entero más cercana a `switching_frequency` para un prescaler
+    fijo. Lanza ValueError si la frecuencia queda fuera del alcance de PR2.
+    """
+    index = get_pwm_frequency_index(F_osc, (TMR2_prescaler,))
+
+    # Hasta medio paso más allá de PR2 = 0 y PR2 = MAX_PR2 todavía se redondea a ellos
+    lowest = F_osc / ((MAX_PR2 + 1.5) * 4 * TMR2_prescaler)
+    highest = F_osc / (0.5 * 4 * TMR2_prescaler)
+
+    if not lowest < switching_frequency <= highest:
+        raise ValueError(f'PWM frequency {switching_frequency:g} Hz is not reachable with '
+                         f'F_osc {F_osc:g} Hz and TMR2 prescaler {TMR2_prescaler}')
+
+    return index.nearest(switching_frequency)
+
+
+if __name__ == "__main__":
+    from time import perf_counter
+
+    index = get_pwm_frequency_index(48e6)
+
+    for target in (20e3, 25e3, 30e3, 40e3):
+        configuration = index.nearest(target)
+        best = index.max_resolution(target, 0.02)
+
+        print(f'{target:.0f} Hz: más cercana {configuration.frequency:.2f} Hz '
+              f'(PR2 {configuration.PR2}, prescaler {configuration.TMR2_prescaler}), '
+              f'máxima resolución a 2 %: {best.resolution_bits:.2f} bits a {best.frequency:.2f} Hz '
+              f'(PR2 {best.PR2}, prescaler {best.TMR2_prescaler})')
+
+    assert get_pwm_configuration(40e3, 32e6, 1).PR2 == 199
+    assert get_pwm_configuration(30e3, 48e6, 4).PR2 == 99
+
+    try:
+        get_pwm_configuration(1e3, 32e6, 1)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('1 kHz needs PR2 > 255 at 32 MHz')
+
+    targets = np.random.default_rng(0).uniform(5e3, 100e3, 100_000)
+
+    start = perf_counter()
+    nearest = index.frequencies[index.get_nearest_indices(targets)]
+    index.get_max_resolution_indices(targets, 0.02)
+    print(f'{len(targets)} consultas: {1e3 * (perf_counter() - start):.2f} ms, '
+          f'error máximo {100 * np.max(np.abs(nearest / targets - 1)):.3f} %')
@@ -0,0 +1,60 @@
+from random import uniform
+from typing import Optional
+
+
+# Constantes de RFC 6298
+RTT_ALPHA = 1 / 8
+RTT_BETA = 1 / 4
+RTT_K = 4
+
+DEFAULT_MIN_TIMEOUT = 0.02
+DEFAULT_MAX_TIMEOUT = 2.0
+
+# Tiempo sin respuesta antes de dar el enlace por perdido
+DEFAULT_FAILURE_TIMEOUT = 1.0
+
+# Cada reintento espera entre 1 y 1 + RETRY_JITTER veces su plazo, para que varios
+# dispositivos que fallan juntos no reintenten al mismo tiempo
+RETRY_JITTER = 0.5
+
+
+class RtoEstimator:
+    """
+    Plazo de respuesta (RTO) a partir del RTT medido, como en TCP: promedio suavizado
+    más cuatro veces la variación, acotado a [min_timeout, max_timeout]. Antes de la
+    primera muestra el plazo es `initial_timeout`.
+    """
+
+    def __init__(self, initial_timeout: float, min_timeout: float = DEFAULT_MIN_TIMEOUT,
+                 max_timeout: float = DEFAULT_MAX_TIMEOUT):
+        if not 0 < min_timeout <= max_timeout:
+            raise ValueError('Timeouts must satisfy 0 < min_timeout <= max_timeout')
+
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+
+        self.timeout = self._bound(initial_timeout)
+
+    def _bound(self, timeout: float) -> float:
+        return min(max(timeout, self.min_timeout), self.max_timeout)
+
+    def observe(self, rtt: float):
+        """ Muestra de un intercambio sin reenvíos (algoritmo de Karn) """
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - RTT_BETA) * self.rttvar + RTT_BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - RTT_ALPHA) * self.srtt + RTT_ALPHA * rtt
+
+        self.timeout = self._bound(self.srtt + RTT_K * self.rttvar)
+
+    def get_retry_timeout(self, attempt: int) -> float:
+        """ Plazo del intento `attempt` (0 es el primer envío): se duplica en cada reintento, con jitter """
+        if attempt == 0:
+            return self.timeout
+
+        return self._bound(self.timeout * 2 ** attempt * uniform(1, 1 + RETRY_JITTER))
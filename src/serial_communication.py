@@ -1,13 +1,29 @@
-from dataclasses import dataclass
+from concurrent.futures import Future
+from dataclasses import replace
 from enum import IntEnum, Enum, auto
-from queue import Queue
-from threading import Thread
-from typing import Optional, Tuple, Any
+from math import inf
+from random import uniform
+from time import monotonic
+from typing import Callable, Dict, Optional, Tuple
+
+import trio
 
 from serial import Serial, SerialException
+from serial.tools.list_ports import comports
 from serial.tools.list_ports_common import ListPortInfo
 
+from baud_rate_solver import BaudRateConfiguration, get_fastest_baud_rate
+from constants import PICValues
+from device_identity import DeviceIdentity, find_device_port
+from frame_codec import ChecksumType, Frame, FrameEncoder, FrameParser, encode_frame
+from link_stats import LinkStats, LinkStatsSnapshot, append_json_line
+from port_watcher import PortWatcher
+from rto_estimator import DEFAULT_FAILURE_TIMEOUT, DEFAULT_MAX_TIMEOUT, DEFAULT_MIN_TIMEOUT, RETRY_JITTER, RtoEstimator
+from setpoint_mailbox import SetpointMailbox
 from spwm_indices import ModulationIndex
+from telemetry import TELEMETRY_FIELDS, DecimatingWriter, TelemetryRing
+from trio_bridge import TrioBridge, call, get_result
+from windowed_protocol import PROTOCOL_WINDOWED, PendingFrame, SendWindow
 
 class MsgType(IntEnum):
     CONN = 1
@@ -18,86 +34,128 @@ class MsgType(IntEnum):
     FETCH = 6
     READY = 7
     EXIT = 8
+    BAUD = 9  # [SPBRGH, SPBRGL, BRG16 << 1 | BRGH]; el dispositivo responde ACK y cambia, EXIT lo devuelve al inicial
 
 
 class CouldNotConnectToDeviceError(Exception):
     pass
 
 
-@dataclass(frozen=True)
-class SerialMessage:
-    function: str
-    args: Optional[Tuple[Any, ...]]
+def recv_message(s: Serial, msg_type: MsgType) -> bytes:
+    """ Lectura bloqueante de una trama sin checksum; entrega [tipo, datos...] """
+    msg_len = s.read()
 
+    if msg_len:
+        data = s.read(int(msg_len[0]))
 
-@dataclass(frozen=True)
-class SerialResult:
-    value: Any
+        if not data or data[0] != msg_type:
+            raise CouldNotConnectToDeviceError(f'{msg_type.name} no recibido.')
 
-    @property
-    def is_error(self):
-        return isinstance(self.value, Exception)
+        return data
+    else:
+        raise CouldNotConnectToDeviceError(f'{msg_type.name} timeout.')
 
 
-def send_conn_message(s: Serial):
-    msg_len = 1
-    s.write(bytearray([msg_len, MsgType.CONN]))
+def get_baud_payload(configuration: BaudRateConfiguration) -> bytes:
+    flags = (configuration.mode.BRG16 << 1) | configuration.mode.BRGH
 
+    return bytes([configuration.SPBRGH, configuration.SPBRGL, flags])
 
-def recv_syn_message(s: Serial) -> ModulationIndex:
-    msg_len = s.read()
 
-    if msg_len:
-        data = s.read(int(msg_len[0]))
+def get_sync_index(payload) -> ModulationIndex:
+    """ Índice del SYNC del handshake; una respuesta mal formada (p. ej. ruido al enchufar) es una conexión fallida """
+    try:
+        return ModulationIndex(payload[0])
+    except (IndexError, ValueError):
+        raise CouldNotConnectToDeviceError('SYNC inválido.') from None
 
-        if data[0] != MsgType.SYNC:
-            raise CouldNotConnectToDeviceError('SYNC no recibido.')
 
-        return ModulationIndex(data[1])
-    else:
-        raise CouldNotConnectToDeviceError('SYNC timeout.')
+def send_conn_message(s: Serial):
+    s.write(encode_frame(MsgType.CONN))
+
+
+def recv_syn_message(s: Serial) -> ModulationIndex:
+    return get_sync_index(recv_message(s, MsgType.SYNC)[1:])
 
 
 def send_ack_message(s: Serial):
-    msg_len = 1
-    s.write(bytearray([msg_len, MsgType.ACK]))
+    s.write(encode_frame(MsgType.ACK))
 
 
 def send_sync_message(s: Serial, modulation_index: ModulationIndex):
-    msg_len = 2
-    s.write(bytearray([msg_len, MsgType.SYNC, modulation_index.value]))
+    s.write(encode_frame(MsgType.SYNC, (modulation_index.value,)))
 
 
 def recv_ack_message(s: Serial):
-    msg_len = s.read()
+    recv_message(s, MsgType.ACK)
 
-    if msg_len:
-        data = s.read(int(msg_len[0]))
 
-        if data[0] != MsgType.ACK:
-            raise CouldNotConnectToDeviceError('ACK no recibido.')
-    else:
-        raise CouldNotConnectToDeviceError('ACK timeout.')
+def send_baud_message(s: Serial, configuration: BaudRateConfiguration):
+    s.write(encode_frame(MsgType.BAUD, get_baud_payload(configuration)))
+
+
+def send_alive_message(s: Serial):
+    s.write(encode_frame(MsgType.ALIVE))
+
+
+def negotiate_baud_rate(s: Serial, configuration: BaudRateConfiguration) -> int:
+    """
+    Pide al dispositivo que cambie al baud rate de `configuration` y lo confirma con
+    un ALIVE a la nueva velocidad. Si el dispositivo no acepta (firmware anterior), el
+    enlace sigue a la velocidad actual. Si acepta pero el ALIVE no tiene respuesta, se
+    vuelve a la velocidad anterior y se confirma ahí con otro ALIVE; solo si ese también
+    falla se pierde el enlace.
+    """
+    baudrate = s.baudrate
+
+    send_baud_message(s, configuration)
+
+    try:
+        recv_ack_message(s)
+    except CouldNotConnectToDeviceError:
+        return baudrate
+
+    s.flush()
+    s.baudrate = configuration.baudrate
+
+    try:
+        send_alive_message(s)
+        recv_ack_message(s)
+    except CouldNotConnectToDeviceError:
+        s.reset_input_buffer()
+        s.baudrate = baudrate
 
+        send_alive_message(s)
+        recv_ack_message(s)
 
+        return baudrate
 
-def conn(port_name: str, baudrate: int, timeout: float):
-    serial_port = Serial(
+    return configuration.baudrate
+
+
+def open_port(port_name: str, baudrate: int, timeout: float) -> Serial:
+    return Serial(
         port_name,
         baudrate,
         timeout=timeout,
         write_timeout=0
     )
 
-    with serial_port as s:
-        send_conn_message(s)
 
-        modulation_index = recv_syn_message(s)
+def conn(s: Serial, baud_rate_configuration: Optional[BaudRateConfiguration] = None) -> Tuple[ModulationIndex, int]:
+    """ Handshake CONN -> SYNC -> ACK sobre un puerto ya abierto; entrega el índice y el baud rate del enlace """
+    send_conn_message(s)
+
+    modulation_index = recv_syn_message(s)
 
-        send_ack_message(s)
+    send_ack_message(s)
 
-        return modulation_index
+    baudrate = s.baudrate
 
+    if baud_rate_configuration is not None and baud_rate_configuration.baudrate != baudrate:
+        baudrate = negotiate_baud_rate(s, baud_rate_configuration)
+
+    return modulation_index, baudrate
 
 
 def sync(s: Serial, modulation_index: ModulationIndex):
@@ -106,85 +164,510 @@ def sync(s: Serial, modulation_index: ModulationIndex):
     recv_ack_message(s)
 
 
-def serial_communication(
-        message_queue: Queue,
-        result_queue: Queue,
+def send_exit_message(s: Serial):
+    s.write(encode_frame(MsgType.EXIT))
+
+    # Con write_timeout=0 la escritura no bloquea: se espera a que salga antes de cerrar
+    s.flush()
+
+
+def close_port(s: Optional[Serial]):
+    if s is None:
+        return
+
+    try:
+        s.close()
+    except SerialException:
+        pass
+
 
-        baudrate: int = 9600,
-        timeout: float = 0.5,
-):
-    connected_port: Optional[ListPortInfo] = None
+# Timeout de cada lectura en el hilo de trio; acota cuánto tarda en notarse una
+# cancelación, y con eso la detección de un enlace caído
+POLL_INTERVAL = 0.01
 
-    while True:
-        value = message_queue.get()
 
+class _WindowedResponse:
+    def __init__(self):
+        self.done = trio.Event()
+        self.data = b''
+        self.error: Optional[Exception] = None
+
+
+class AsyncSerialTransport:
+    """
+    Protocolo serial como corrutinas de trio. Las lecturas bloqueantes de pyserial
+    corren en hilos de trio con un timeout corto, así que cada intercambio se puede
+    cancelar y tiene un plazo. Las escrituras no bloquean (write_timeout=0).
+
+    El handshake usa `timeout` como plazo. Después, el plazo de cada respuesta sale
+    del RTT medido (ver RtoEstimator) y se duplica, con jitter, en cada reintento. Si
+    un mensaje sigue sin respuesta `failure_timeout` segundos después del primer
+    envío, el enlace se da por perdido.
+
+    Se lee todo lo que haya llegado de una vez hacia el buffer del FrameParser, y
+    las tramas salen del FrameEncoder. El CRC (`checksum`) queda apagado por defecto
+    porque el firmware actual no lo envía.
+
+    Con `window` > 0 se pide en el CONN el modo con ventana (ver windowed_protocol);
+    si el dispositivo lo acepta, varias tramas quedan en vuelo a la vez y las
+    respuestas las procesa `run_receiver`, que debe correr durante la sesión.
+
+    Los tiempos de respuesta y contadores del enlace se acumulan en `stats`, que se
+    puede compartir entre transportes sucesivos del mismo puerto.
+    """
+
+    def __init__(self, port_name: str, baudrate: int = 9600, timeout: float = 0.5,
+                 checksum: ChecksumType = ChecksumType.NONE, window: int = 0, stats: Optional[LinkStats] = None,
+                 min_timeout: float = DEFAULT_MIN_TIMEOUT, max_timeout: float = DEFAULT_MAX_TIMEOUT,
+                 failure_timeout: float = DEFAULT_FAILURE_TIMEOUT):
+        self.port_name = port_name
+        self.baudrate = baudrate
+        self.timeout = timeout
+
+        self.rto = RtoEstimator(timeout, min_timeout, max_timeout)
+        self.failure_timeout = failure_timeout
+
+        self.serial: Optional[Serial] = None
+
+        self._encoder = FrameEncoder(checksum)
+        self._parser = FrameParser(checksum, valid_types=frozenset(MsgType))
+
+        self.stats = LinkStats() if stats is None else stats
+        self._checksum_errors = 0  # Ya sumados a `stats`
+
+        # Cualquier trama recibida sirve de latido
+        self.last_received = -inf
+
+        # Error del enlace que terminó la sesión
+        self.failure: Optional[Exception] = None
+
+        # Recibe los datos de las tramas FETCH que el dispositivo envía sin que se pidan
+        self.on_telemetry: Optional[Callable[[bytes], None]] = None
+
+        # Un intercambio pregunta/respuesta a la vez
+        self._lock = trio.Lock()
+
+        # ALIVE en curso que un índice puede interrumpir; si lo hace, el ACK de ese
+        # ALIVE todavía puede llegar y lo descarta el intercambio siguiente
+        self._heartbeat_scope: Optional[trio.CancelScope] = None
+        self._alive_pending = False
+
+        self.requested_window = window
+        self.window: Optional[SendWindow] = None
+
+        self._responses: Dict[int, _WindowedResponse] = {}
+        self._window_open = trio.Event()
+
+    def send(self, msg_type: MsgType, payload=b''):
+        frame = self._encoder.encode(msg_type, payload)
+
+        self.serial.write(frame)
+
+        self.stats.frames_out += 1
+        self.stats.bytes_out += len(frame)
+
+    def _read_available(self) -> int:
+        """ Lee lo que haya en el puerto (al menos un byte, o hasta el timeout) directo al buffer del parser """
+        view = self._parser.get_write_view(max(1, self.serial.in_waiting))
+
+        n = self.serial.readinto(view)
+        self._parser.commit(n)
+
+        self.stats.bytes_in += n
+
+        return n
+
+    async def _next_frame(self) -> Frame:
+        while True:
+            for frame in self._parser.frames():
+                self.stats.frames_in += 1
+                self.last_received = trio.current_time()
+
+                return frame
+
+            self.stats.checksum_errors += self._parser.checksum_errors - self._checksum_errors
+            self._checksum_errors = self._parser.checksum_errors
+
+            await trio.to_thread.run_sync(self._read_available)
+
+    async def recv_message(self, msg_type: MsgType, timeout: Optional[float] = None) -> Frame:
+        """ Recibe la siguiente trama y verifica su tipo; sus datos son válidos hasta la próxima lectura """
         try:
-            if value.function == 'conn':
-                port = value.args[0]
-                try:
-                    result = conn(port, baudrate, timeout)
+            with trio.fail_after(self.rto.timeout if timeout is None else timeout):
+                frame = await self._next_frame()
+        except trio.TooSlowError:
+            self.stats.timeouts += 1
 
-                    connected_port = port
+            # Lo que haya llegado a medias desalinearía el siguiente mensaje
+            self.serial.reset_input_buffer()
+            self._parser.clear()
 
-                    result_queue.put(SerialResult(result))
-                except CouldNotConnectToDeviceError:
-                    result_queue.put(SerialResult(CouldNotConnectToDeviceError))
+            raise CouldNotConnectToDeviceError(f'{msg_type.name} timeout.')
 
-            elif value.function == 'sync':
-                if connected_port is None:
-                    continue
+        if frame.msg_type != msg_type:
+            raise CouldNotConnectToDeviceError(f'{msg_type.name} no recibido.')
 
-                serial_port = Serial(
-                    connected_port,
-                    baudrate,
-                    timeout=timeout,
-                    write_timeout=0
-                )
+        return frame
 
-                retries = 5
+    def _observe_rtt(self, msg_type: MsgType, rtt: float):
+        self.rto.observe(rtt)
 
-                modulation_index = value.args[0]
+        self.stats.record_rtt(msg_type.name, rtt)
+        self.stats.rto = self.rto.timeout
 
-                with serial_port as s:
-                    while retries:
-                        try:
-                            sync(s, modulation_index)
+    async def exchange(self, msg_type: MsgType, payload, response_type: MsgType,
+                       timeout: Optional[float] = None, sample: bool = True, stale_acks: int = 0) -> Frame:
+        """
+        Envía una trama y espera la respuesta. Con `sample`, el tiempo de ida y vuelta
+        alimenta el RTO y `stats`; en un reintento no, porque la respuesta podría ser
+        la del envío anterior (algoritmo de Karn). Antes de la respuesta se descartan
+        `stale_acks` ACK de tramas anteriores (un ALIVE interrumpido).
+        """
+        self.send(msg_type, payload)
+
+        sent_at = trio.current_time()
+
+        for _ in range(stale_acks):
+            await self.recv_message(MsgType.ACK, timeout)
+
+        frame = await self.recv_message(response_type, timeout)
+
+        if sample:
+            self._observe_rtt(msg_type, trio.current_time() - sent_at)
+
+        return frame
+
+    async def _open(self, baudrate: int):
+        self.serial = await trio.to_thread.run_sync(open_port, self.port_name, baudrate, POLL_INTERVAL)
+
+    async def connect(
+            self, baud_rate_configuration: Optional[BaudRateConfiguration] = None,
+            resume_index: Optional[ModulationIndex] = None
+    ) -> Tuple[ModulationIndex, int]:
+        """
+        Con `resume_index` el CONN es [protocolo, ventana, índice]: el firmware que
+        reanuda sesiones adopta ese índice y lo devuelve en el SYNC, así que la sesión
+        se restablece en un solo round trip. El firmware anterior devuelve su propio
+        índice y hay que enviarlo aparte.
+        """
+        await self._open(self.baudrate)
+
+        try:
+            async with self._lock:
+                payload = (PROTOCOL_WINDOWED, self.requested_window) if self.requested_window else ()
+
+                if resume_index is not None:
+                    payload = (payload or (0, 0)) + (resume_index.value,)
+
+                frame = await self.exchange(MsgType.CONN, payload, MsgType.SYNC, self.timeout)
+                modulation_index = get_sync_index(frame.payload)
+
+                # El firmware anterior no agrega la ventana concedida
+                if self.requested_window and len(frame.payload) > 1 and frame.payload[1]:
+                    self.window = SendWindow(min(frame.payload[1], self.requested_window))
+
+                self.send(MsgType.ACK)
+
+                if baud_rate_configuration is not None and baud_rate_configuration.baudrate != self.baudrate:
+                    await self._negotiate_baud_rate(baud_rate_configuration)
+        except BaseException:
+            await self.aclose()
+
+            raise
+
+        self.last_received = trio.current_time()
+
+        return modulation_index, self.serial.baudrate
+
+    async def _negotiate_baud_rate(self, configuration: BaudRateConfiguration):
+        """ Igual que `negotiate_baud_rate` """
+        try:
+            await self.exchange(MsgType.BAUD, get_baud_payload(configuration), MsgType.ACK, self.timeout)
+        except CouldNotConnectToDeviceError:
+            return
+
+        baudrate = self.serial.baudrate
+
+        await trio.to_thread.run_sync(self.serial.flush)
+        self.serial.baudrate = configuration.baudrate
+
+        try:
+            await self.exchange(MsgType.ALIVE, b'', MsgType.ACK, self.timeout)
+        except CouldNotConnectToDeviceError:
+            # Lo recibido a la velocidad nueva no sirve
+            self.serial.reset_input_buffer()
+            self._parser.clear()
+
+            self.serial.baudrate = baudrate
+
+            await self.exchange(MsgType.ALIVE, b'', MsgType.ACK, self.timeout)
+
+    async def wait_for_window(self):
+        while self.window.is_full:
+            self._window_open = trio.Event()
+
+            await self._window_open.wait()
+
+    def send_request(self, msg_type: MsgType, payload=b'') -> int:
+        """ Envía una trama numerada sin esperar la respuesta (modo con ventana); debe haber lugar en la ventana """
+        frame = self.window.register(msg_type, bytes(payload), trio.current_time(), self.rto.timeout)
+
+        self._responses[frame.seq] = _WindowedResponse()
+        self.send(msg_type, bytes([frame.seq]) + frame.payload)
+
+        return frame.seq
+
+    async def wait_response(self, seq: int) -> bytes:
+        """ Espera la confirmación de la trama `seq`; entrega los datos si la respuesta los trae """
+        response = self._responses[seq]
+
+        try:
+            await response.done.wait()
+        finally:
+            # La respuesta queda hasta que la recoge quien espera, aunque llegue antes de que empiece a esperar
+            if self._responses.get(seq) is response:
+                del self._responses[seq]
+
+        if response.error is not None:
+            raise response.error
+
+        return response.data
+
+    async def request(self, msg_type: MsgType, payload=b'') -> bytes:
+        await self.wait_for_window()
+
+        return await self.wait_response(self.send_request(msg_type, payload))
+
+    def _finish(self, frame: PendingFrame, data: bytes = b''):
+        # Algoritmo de Karn: una trama reenviada no dice a cuál envío corresponde la respuesta
+        if frame.transmissions == 1:
+            self._observe_rtt(MsgType(frame.msg_type), trio.current_time() - frame.sent_at)
+
+        response = self._responses.get(frame.seq)
+
+        if response is not None and not response.done.is_set():
+            response.data = data
+            response.done.set()
+
+    def _fail_pending(self, error: Exception):
+        for response in self._responses.values():
+            if not response.done.is_set():
+                response.error = error
+                response.done.set()
+
+    def _handle_windowed_frame(self, frame: Frame):
+        if not frame.payload:
+            return
+
+        seq = frame.payload[0]
+
+        if frame.msg_type == MsgType.ACK:
+            for pending in self.window.acknowledge(seq):
+                self._finish(pending)
+        elif frame.msg_type == MsgType.NACK:
+            for pending in self.window.acknowledge(seq):
+                self._finish(pending)
+
+            # Retransmisión selectiva: solo la trama que falta. Cada trama que llega
+            # después del hueco genera otro NACK igual, así que después del primer
+            # reenvío se espera al menos un cuarto del plazo antes de repetirlo
+            missing = self.window.pending.get(seq)
+
+            if missing is not None and (missing.transmissions == 1 or
+                                        trio.current_time() - missing.sent_at >= self.rto.timeout / 4):
+                self._retransmit(missing)
+        elif frame.msg_type == MsgType.FETCH and len(frame.payload) == len(TELEMETRY_FIELDS):
+            # Muestra enviada por el dispositivo: sin número de secuencia
+            if self.on_telemetry is not None:
+                self.on_telemetry(bytes(frame.payload))
+        else:
+            pending = self.window.complete(seq)
+
+            if pending is not None:
+                self._finish(pending, bytes(frame.payload[1:]))
+
+        if not self.window.is_full:
+            self._window_open.set()
+
+    def _get_retry_timeout(self, attempt: int, first_sent_at: float) -> float:
+        """ Plazo del reintento, sin pasarse del presupuesto para detectar la falla """
+        remaining = first_sent_at + self.failure_timeout - trio.current_time()
+
+        return max(0.0, min(self.rto.get_retry_timeout(attempt), remaining))
+
+    def _retransmit(self, frame: PendingFrame):
+        now = trio.current_time()
+
+        if self.window.is_exhausted(frame, now, self.failure_timeout):
+            raise CouldNotConnectToDeviceError(f'{MsgType(frame.msg_type).name} {frame.seq} sin respuesta.')
+
+        self.window.mark_retransmitted(frame, now, self._get_retry_timeout(frame.transmissions, frame.first_sent_at))
+        self.stats.retransmissions += 1
+
+        self.send(frame.msg_type, bytes([frame.seq]) + frame.payload)
+
+    async def run_receiver(self):
+        """
+        Recibe las respuestas del modo con ventana y reenvía lo que no se confirma a
+        tiempo. Si una trama agota sus reenvíos, o falla el puerto, todas las
+        esperas pendientes terminan con ese error.
+        """
+        try:
+            while True:
+                with trio.move_on_after(self.rto.timeout / 4):
+                    self._handle_windowed_frame(await self._next_frame())
+
+                for frame in self.window.get_expired(trio.current_time()):
+                    self._retransmit(frame)
+        except (CouldNotConnectToDeviceError, SerialException) as e:
+            self._fail_pending(e)
+
+            raise
+        except BaseException:
+            self._fail_pending(CouldNotConnectToDeviceError('Sesión terminada.'))
+
+            raise
+
+    async def _exchange_with_retries(self, msg_type: MsgType, payload, response_type: MsgType) -> Frame:
+        """
+        Pregunta/respuesta reintentando hasta agotar `failure_timeout`; un error del
+        puerto lo reabre una vez. Se llama con el lock tomado.
+        """
+        reopened = False
+        attempt = 0
+
+        first_sent_at = trio.current_time()
+
+        while True:
+            # Solo el primer envío puede tener delante el ACK del ALIVE interrumpido; si no
+            # llega, el timeout ya vació el buffer
+            stale_acks, self._alive_pending = int(self._alive_pending), False
+
+            try:
+                return await self.exchange(msg_type, payload, response_type,
+                                           self._get_retry_timeout(attempt, first_sent_at),
+                                           sample=attempt == 0 and not stale_acks, stale_acks=stale_acks)
+            except CouldNotConnectToDeviceError:
+                if trio.current_time() - first_sent_at >= self.failure_timeout:
+                    raise CouldNotConnectToDeviceError(f'{msg_type.name} sin respuesta.')
+
+                attempt += 1
+                self.stats.retries += 1
+            except SerialException:
+                if reopened:
+                    raise
+
+                baudrate = self.serial.baudrate
+
+                await trio.to_thread.run_sync(close_port, self.serial)
+                await self._open(baudrate)
+
+                self._parser.clear()
+
+                reopened = True
+
+    async def sync(self, modulation_index: ModulationIndex):
+        """ Envía el índice de modulación hasta recibir ACK o agotar `failure_timeout` """
+        if self.window is not None:
+            await self.request(MsgType.SYNC, (modulation_index.value,))
+
+            return
+
+        self._preempt_heartbeat()
+
+        async with self._lock:
+            await self._exchange_with_retries(MsgType.SYNC, (modulation_index.value,), MsgType.ACK)
+
+    async def fetch(self) -> bytes:
+        """ Pide una muestra de telemetría; entrega los valores de TELEMETRY_FIELDS """
+        if self.window is not None:
+            return await self.request(MsgType.FETCH)
+
+        self._preempt_heartbeat()
+
+        async with self._lock:
+            frame = await self._exchange_with_retries(MsgType.FETCH, b'', MsgType.FETCH)
+            data = bytes(frame.payload)
+
+            self.send(MsgType.ACK)
 
-                            break
-                        except CouldNotConnectToDeviceError:
-                            retries -= 1
+        return data
 
-                if retries:
-                    continue
-                else:
-                    connected_port = None
+    @property
+    def is_awaiting_response(self) -> bool:
+        if self.window is not None:
+            return bool(self.window.pending)
+
+        return self._lock.locked()
+
+    def _preempt_heartbeat(self):
+        if self._heartbeat_scope is not None:
+            self._heartbeat_scope.cancel()
+
+    async def heartbeat(self, timeout: float) -> bool:
+        """
+        ALIVE -> ACK; False si el dispositivo no respondió dentro de `timeout`. Si hay
+        un intercambio en curso no se envía nada, porque su respuesta ya sirve de latido.
+        En modo pregunta/respuesta un `sync` o `fetch` interrumpe el ALIVE en vez de
+        esperarlo; su propia respuesta sirve de latido.
+        """
+        if self.window is not None:
+            if self.window.is_full:
+                return True
+
+            with trio.move_on_after(timeout):
+                await self.wait_response(self.send_request(MsgType.ALIVE))
 
-                    result_queue.put(SerialResult(CouldNotConnectToDeviceError))
+                return True
 
-            elif value.function == 'exit':
-                if connected_port is None:
-                    continue
+            return False
 
-                serial_port = Serial(
-                    connected_port,
-                    baudrate,
-                    timeout=timeout,
-                    write_timeout=0
-                )
+        try:
+            self._lock.acquire_nowait()
+        except trio.WouldBlock:
+            return True
 
-                with serial_port as s:
-                    msg_len = 1
+        try:
+            with trio.CancelScope() as self._heartbeat_scope:
+                try:
+                    await self.exchange(MsgType.ALIVE, b'', MsgType.ACK, timeout)
+                except CouldNotConnectToDeviceError:
+                    return False
 
-                    s.write(bytearray([msg_len, MsgType.EXIT]))
+                return True
 
-                connected_port = None
-        except SerialException:
-            result_queue.put(SerialResult(CouldNotConnectToDeviceError))
+            # Interrumpido por un índice: su intercambio descarta el ACK de este ALIVE
+            self._alive_pending = True
+
+            return True
+        finally:
+            self._heartbeat_scope = None
+            self._lock.release()
+
+    async def exit(self):
+        if self.serial is None:
+            return
+
+        try:
+            async with self._lock:
+                self.send(MsgType.EXIT)
+
+                # Se espera a que la trama salga antes de cerrar
+                await trio.to_thread.run_sync(self.serial.flush)
+        finally:
+            await self.aclose()
+
+    async def aclose(self):
+        if self.serial is not None:
+            await trio.to_thread.run_sync(close_port, self.serial)
+
+            self.serial = None
 
 
 class SerialPortStatus(Enum):
     CONNECTED = auto()
     CONNECTING = auto()
+    RECONNECTING = auto()
     CONN_SYNC = auto()
     NOT_CONNECTED = auto()
     DISCONNECTED = auto()
@@ -193,80 +676,546 @@ class SerialPortStatus(Enum):
     COULD_NOT_CONNECT_ERROR = auto()
 
 
-class SerialPort:
-    def __init__(self, baudrate: int = 9600, timeout: float = 0.5):
-        # Se crean dos colas para comunic
+def get_modulation_index(modulation_index: float) -> ModulationIndex:
+    return ModulationIndex(int(modulation_index * 100 - 20) / 5)
 
-        self.message_queue = Queue(maxsize=1)
-        self.result_queue = Queue(maxsize=1)
 
-        # Abre un proceso
+# Espera entre intentos de reconexión: empieza corta para un tirón del cable y crece
+# hasta dar tiempo a que el USB se re-enumere
+RECONNECT_MIN_DELAY = 0.05
+RECONNECT_MAX_DELAY = 0.25
 
-        self.thread = Thread(target=serial_communication,
-                             args=(self.message_queue,
-                                   self.result_queue,
-                                   baudrate,
-                                   timeout),
-                             daemon=True)
 
-        self.thread.start()
+class SerialPort:
+    """
+    Fachada síncrona para la GUI: cada operación se lanza en el loop de trio de un
+    TrioBridge y vuelve de inmediato. `dispatch` decide en qué hilo corren los
+    callbacks (en la GUI, el Clock de Kivy).
+
+    `timeout` es el plazo del handshake; el resto de los plazos se adapta al RTT
+    medido dentro de [min_timeout, max_timeout], y `failure_timeout` es cuánto se
+    insiste con un mensaje antes de pasar a TIMEOUT_ERROR.
+
+    Con `heartbeat_interval`, si no llegó nada en ese intervalo se envía un ALIVE, y
+    si el dispositivo no responde durante `missed_heartbeats` intervalos (a un
+    ALIVE o a cualquier otro mensaje; como mínimo dos plazos de respuesta) se pasa
+    a TIMEOUT_ERROR. Mientras haya tráfico no se envían latidos, y un índice no
+    espera a un ALIVE en curso: lo interrumpe. Los latidos están apagados por
+    defecto, como BAUD y el modo con ventana: un firmware que no responde ALIVE se
+    daría por perdido una y otra vez. Sin latidos, un enlace caído se nota en el
+    siguiente mensaje que no tiene respuesta.
+
+    Con `stats_path`, mientras haya sesión se agrega cada `stats_interval` segundos
+    una línea JSON con `stats()` a ese archivo.
+
+    La telemetría (ver telemetry) se pide con FETCH cada `telemetry_interval`
+    segundos, y también se aceptan las muestras que el dispositivo envía por su cuenta
+    en modo con ventana. Cada muestra lleva el tiempo de time.monotonic al recibirla y
+    queda en `telemetry`; con `telemetry_path` también se guarda una de cada
+    `telemetry_decimation` en ese archivo.
+
+    Con `auto_reconnect`, si se pierde el enlace se busca el mismo dispositivo (por
+    número de serie USB, aunque cambie de puerto, ver DeviceIdentity) y se reconecta
+    reanudando el último índice, durante hasta `reconnect_timeout` segundos. Mientras
+    tanto el estado es RECONNECTING. Cada intento prueba primero el baud rate negociado
+    y después el inicial, por si el dispositivo se reinició. Con `port_watcher` el dispositivo se busca en su
+    lista de puertos en lugar de enumerarlos en cada intento.
+    """
+
+    def __init__(self, baudrate: int = 9600, timeout: float = 0.5, max_baudrate: Optional[int] = None,
+                 dispatch: Callable[[Callable[[], None]], None] = call, min_sync_interval: float = 0.02,
+                 checksum: ChecksumType = ChecksumType.NONE, window: int = 0, bridge: Optional[TrioBridge] = None,
+                 stats_path: Optional[str] = None, stats_interval: float = 1.0,
+                 min_timeout: float = DEFAULT_MIN_TIMEOUT, max_timeout: float = DEFAULT_MAX_TIMEOUT,
+                 failure_timeout: float = DEFAULT_FAILURE_TIMEOUT, heartbeat_interval: Optional[float] = None,
+                 missed_heartbeats: int = 3, telemetry_interval: Optional[float] = None,
+                 telemetry_capacity: int = 4096, telemetry_path: Optional[str] = None, telemetry_decimation: int = 1,
+                 auto_reconnect: bool = True, reconnect_timeout: float = 30.0,
+                 port_watcher: Optional[PortWatcher] = None):
+        # Con `max_baudrate` se negocia, después del CONN, el baud rate estándar más alto
+        # que el EUSART del PIC genera con error tolerable
+
+        self.baud_rate_configuration = None
+
+        if max_baudrate is not None:
+            self.baud_rate_configuration = get_fastest_baud_rate(PICValues.F_OSC, max_baudrate)
+
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.failure_timeout = failure_timeout
+
+        self.heartbeat_interval = heartbeat_interval
+        self.missed_heartbeats = missed_heartbeats
+
+        self.checksum = checksum
+
+        # Tramas en vuelo que se piden en el CONN; 0 mantiene el modo pregunta/respuesta
+        self.window = window
+
+        # Varios puertos pueden compartir el mismo loop de trio (ver InverterManager)
+        self.bridge = TrioBridge(dispatch) if bridge is None else bridge
+
+        self.transport: Optional[AsyncSerialTransport] = None
+
+        # Dispositivo de la última conexión, para reconectarse a él
+        self.device: Optional[DeviceIdentity] = None
+
+        # Baud rate negociado en la última conexión; el dispositivo sigue en él si no se reinició
+        self.link_baudrate: Optional[int] = None
+
+        self.auto_reconnect = auto_reconnect
+        self.reconnect_timeout = reconnect_timeout
+        self.port_watcher = port_watcher
+
+        self._reconnect_scope: Optional[trio.CancelScope] = None
+
+        # Cambia con cada connect/exit del usuario; una reconexión de una sesión anterior no se aplica
+        self._generation = 0
+
+        # Se acumulan entre sesiones
+        self.link_stats = LinkStats()
+
+        self.stats_path = stats_path
+        self.stats_interval = stats_interval
+
+        self.telemetry_interval = telemetry_interval
+        self.telemetry = TelemetryRing(telemetry_capacity)
+        self.telemetry_writer: Optional[DecimatingWriter] = None
+
+        if telemetry_path is not None:
+            # Los bloques se escriben en un hilo de trio (ver _flush_telemetry)
+            self.telemetry_writer = DecimatingWriter(telemetry_path, telemetry_decimation, auto_flush=False)
+
+        self._telemetry_flush_lock = trio.Lock()
+
+        # Índice de modulación a enviar; solo viaja el último y si cambió
+        self.setpoints = SetpointMailbox(min_sync_interval)
+        self._sender_scope: Optional[trio.CancelScope] = None
+        self._session_done: Optional[trio.Event] = None
 
         self.is_connected = False
 
         self.port_name: Optional[str] = None
         self.status = SerialPortStatus.NOT_CONNECTED
 
-    def connect(self, port_info: ListPortInfo) -> Optional[Tuple[int, int, int]]:
-        # Si por alguna razón el usuario, intenta conectarse al
+    def _new_transport(self, port_name: str, baudrate: Optional[int] = None) -> AsyncSerialTransport:
+        return AsyncSerialTransport(port_name, self.baudrate if baudrate is None else baudrate, self.timeout,
+                                    self.checksum, self.window, self.link_stats, self.min_timeout, self.max_timeout,
+                                    self.failure_timeout)
 
-        if port_info.name == self.port_name:
-            return
+    async def _stop_session(self):
+        session_done = self._session_done
+
+        self._stop_sender()
+
+        # Las lecturas en curso terminan antes de cerrar el puerto
+        if session_done is not None:
+            await session_done.wait()
+
+    async def _connect(self, transport: AsyncSerialTransport, device: DeviceIdentity) -> Optional[float]:
+        generation = self._generation
+
+        self._stop_reconnect()
+
+        await self._stop_session()
+
+        if self.transport is not None:
+            await self.transport.aclose()
 
-        port_name = port_info.name
+        self.transport = transport
 
-        self.message_queue.put(SerialMessage('conn', (port_name,)))
+        try:
+            modulation_index, link_baudrate = await transport.connect(self.baud_rate_configuration)
+        except (CouldNotConnectToDeviceError, SerialException):
+            if generation != self._generation:
+                return None
 
-        result: SerialResult = self.result_queue.get()
+            self.transport = None
 
-        if result.value is CouldNotConnectToDeviceError:
             self.port_name = None
             self.is_connected = False
 
             self.status = SerialPortStatus.COULD_NOT_CONNECT_ERROR
 
             return None
+
+        # Un exit o connect del usuario durante el handshake: esta conexión ya no corresponde
+        if generation != self._generation:
+            if self.transport is transport:
+                self.transport = None
+
+            await transport.aclose()
+
+            return None
+
+        self.link_baudrate = link_baudrate
+        self.device = device
+        self.setpoints.reset(modulation_index)
+
+        self._start_session(transport)
+
+        return (modulation_index.value * 5 + 20) / 100
+
+    def _start_session(self, transport: AsyncSerialTransport):
+        self.port_name = transport.port_name
+        self.is_connected = True
+
+        self.status = SerialPortStatus.CONNECTED
+
+        self.link_stats.session_started()
+
+        transport.on_telemetry = self._record_telemetry
+
+        self._sender_scope = trio.CancelScope()
+        self._session_done = trio.Event()
+
+        self.bridge.spawn(self._run_session, transport, self._sender_scope, self._session_done)
+
+    async def async_connect(self, port_name: str, device: Optional[DeviceIdentity] = None) -> Optional[float]:
+        """ Como `connect`, para usar desde el loop de trio """
+        self._generation += 1
+
+        self.status = SerialPortStatus.CONNECTING
+
+        return await self._connect(self._new_transport(port_name),
+                                   DeviceIdentity(port_name) if device is None else device)
+
+    def connect(self, port_info: ListPortInfo,
+                callback: Optional[Callable[[Optional[float]], None]] = None) -> Optional[Future]:
+        """
+        Inicia la conexión sin bloquear. El Future (y `callback`) entregan el índice de
+        modulación del dispositivo, o None si no se pudo conectar; un error inesperado
+        queda en el Future y `callback` recibe None.
+        """
+        # Si por alguna razón el usuario, intenta conectarse al mismo dispositivo
+        if port_info.name == self.port_name:
+            return None
+
+        self.status = SerialPortStatus.CONNECTING
+
+        return self.bridge.submit(self.async_connect, port_info.name, DeviceIdentity.from_port_info(port_info),
+                                  callback=None if callback is None else lambda future: callback(get_result(future)))
+
+    def _stop_sender(self):
+        if self._sender_scope is not None:
+            self._sender_scope.cancel()
+
+            self._sender_scope = None
+
+    def _lose_connection(self, transport: AsyncSerialTransport, error: Exception):
+        transport.failure = error
+
+        # Un exit o una conexión nueva mientras tanto ya cambiaron el estado
+        if transport is not self.transport:
+            return
+
+        self.transport = None
+
+        self.link_stats.session_ended(f'{type(error).__name__}: {error}')
+
+        # Un exit o connect pedido desde la GUI ya cambió el estado visible
+        if self.status != SerialPortStatus.CONNECTED:
+            return
+
+        self.is_connected = False
+        self.port_name = None
+
+        if self.auto_reconnect and self.device is not None:
+            self.status = SerialPortStatus.RECONNECTING
         else:
-            self.port_name = port_name
-            self.is_connected = True
+            self.status = SerialPortStatus.TIMEOUT_ERROR
+
+    async def _guard_session(self, transport: AsyncSerialTransport, cancel_scope: trio.CancelScope, async_fn, *args):
+        """
+        Un error del enlace en cualquier tarea de la sesión termina la sesión completa.
+        Un error inesperado también: se trata como enlace perdido en vez de terminar el
+        loop de trio que comparten todos los puertos del bridge.
+        """
+        try:
+            await async_fn(*args)
+        except Exception as e:
+            # El estado cambia ya; el puerto se cierra cuando terminen las otras tareas
+            self._lose_connection(transport, e)
+
+            cancel_scope.cancel()
+
+    async def _run_session(self, transport: AsyncSerialTransport, cancel_scope: trio.CancelScope, done: trio.Event):
+        try:
+            with cancel_scope:
+                async with trio.open_nursery() as nursery:
+                    if transport.window is not None:
+                        nursery.start_soon(self._guard_session, transport, cancel_scope, transport.run_receiver)
+
+                    if self.heartbeat_interval is not None:
+                        nursery.start_soon(self._guard_session, transport, cancel_scope, self._heartbeat, transport)
+
+                    if self.telemetry_interval is not None:
+                        nursery.start_soon(self._guard_session, transport, cancel_scope, self._poll_telemetry, transport)
+
+                    if self.stats_path is not None:
+                        nursery.start_soon(self._guard_session, transport, cancel_scope, self._dump_stats, transport)
+
+                    await self._guard_session(transport, cancel_scope, self._send_setpoints, transport, nursery)
+        finally:
+            with trio.CancelScope(shield=True):
+                if self.telemetry_writer is not None:
+                    self.telemetry_writer.stage()
+
+                    await self._flush_telemetry()
+
+                if transport.failure is not None:
+                    await transport.aclose()
+
+            done.set()
 
-            self.status = SerialPortStatus.CONNECTED
-            modulation_index: ModulationIndex = result.value
+        if transport.failure is not None and self.status == SerialPortStatus.RECONNECTING:
+            self._reconnect_scope = trio.CancelScope()
 
-            return (modulation_index.value * 5 + 20) / 100
+            self.bridge.spawn(self._reconnect, self.device, self._generation, self._reconnect_scope)
+
+    def _stop_reconnect(self):
+        if self._reconnect_scope is not None:
+            self._reconnect_scope.cancel()
+
+            self._reconnect_scope = None
+
+    async def _find_port(self, device: DeviceIdentity) -> Optional[str]:
+        if not device.has_serial_number:
+            return device.port_name
+
+        if self.port_watcher is not None:
+            # Lo que llegue a detectar este escaneo se ve en el próximo intento
+            self.port_watcher.rescan()
+
+            port_infos = self.port_watcher.ports
+        else:
+            port_infos = await trio.to_thread.run_sync(comports)
+
+        port_info = find_device_port(device, port_infos)
+
+        return None if port_info is None else port_info.name
+
+    def _get_reconnect_baud_rates(self) -> Tuple[int, ...]:
+        """ Primero el baud rate negociado, por si el dispositivo no se reinició; después el inicial """
+        if self.link_baudrate is None or self.link_baudrate == self.baudrate:
+            return self.baudrate,
+
+        return self.link_baudrate, self.baudrate
+
+    async def _reconnect(self, device: DeviceIdentity, generation: int, cancel_scope: trio.CancelScope):
+        """ Reintenta con espera creciente hasta `reconnect_timeout`; cada intento reanuda el último índice """
+        delay = RECONNECT_MIN_DELAY
+
+        with cancel_scope, trio.move_on_after(self.reconnect_timeout):
+            while True:
+                port_name = await self._find_port(device)
+
+                if port_name is not None:
+                    resume_index = self.setpoints.get_latest()
+                    result = None
+
+                    for baudrate in self._get_reconnect_baud_rates():
+                        transport = self._new_transport(port_name, baudrate)
+
+                        try:
+                            result = await transport.connect(self.baud_rate_configuration, resume_index)
+                        except (CouldNotConnectToDeviceError, SerialException):
+                            continue
+
+                        break
+
+                    if result is not None:
+                        # Un connect o exit del usuario mientras tanto
+                        if generation != self._generation:
+                            await transport.aclose()
+
+                            return
+
+                        modulation_index, self.link_baudrate = result
+
+                        self._reconnect_scope = None
+
+                        self.transport = transport
+                        self.device = replace(device, port_name=port_name)
+
+                        self.setpoints.reset(modulation_index)
+
+                        # Firmware sin reanudación: el índice viaja en un SYNC aparte
+                        if resume_index is not None and modulation_index != resume_index:
+                            self.setpoints.post(resume_index)
+
+                        self._start_session(transport)
+
+                        return
+
+                await trio.sleep(delay * uniform(1, 1 + RETRY_JITTER))
+
+                delay = min(2 * delay, RECONNECT_MAX_DELAY)
+
+        if generation == self._generation and self.status == SerialPortStatus.RECONNECTING:
+            self._reconnect_scope = None
+
+            self.status = SerialPortStatus.TIMEOUT_ERROR
+
+    async def _send_setpoints(self, transport: AsyncSerialTransport, nursery: trio.Nursery):
+        """ Envía cada índice que entrega el buzón; con ventana, sin esperar el ACK del anterior """
+        while True:
+            modulation_index = await self.setpoints.receive()
+
+            if transport.window is None:
+                try:
+                    await transport.sync(modulation_index)
+                except (CouldNotConnectToDeviceError, SerialException):
+                    self.setpoints.failed(modulation_index)
+
+                    raise
+
+                self.setpoints.sent(modulation_index)
+                self.setpoints.confirmed(modulation_index)
+            else:
+                await transport.wait_for_window()
+
+                # Se numera aquí y no en otra tarea para que las tramas salgan en orden
+                seq = transport.send_request(MsgType.SYNC, (modulation_index.value,))
+
+                # Salió, pero se confirma recién con el ACK (ver _confirm_setpoint)
+                self.setpoints.sent(modulation_index)
+
+                nursery.start_soon(self._confirm_setpoint, transport, seq, modulation_index)
+
+    async def _confirm_setpoint(self, transport: AsyncSerialTransport, seq: int, modulation_index: ModulationIndex):
+        try:
+            await transport.wait_response(seq)
+        except (CouldNotConnectToDeviceError, SerialException):
+            # El receptor ya terminó la sesión; el valor queda pendiente para la próxima
+            self.setpoints.failed(modulation_index)
+        else:
+            self.setpoints.confirmed(modulation_index)
+
+    async def _heartbeat(self, transport: AsyncSerialTransport):
+        while True:
+            await trio.sleep(self.heartbeat_interval)
+
+            # Nunca menos que dos plazos de respuesta, para que un reenvío alcance a llegar
+            dead_time = max(self.heartbeat_interval * self.missed_heartbeats, 2 * transport.rto.timeout)
+
+            silence = trio.current_time() - transport.last_received
+
+            if transport.is_awaiting_response:
+                if silence >= dead_time:
+                    raise CouldNotConnectToDeviceError(f'Sin respuesta durante {silence * 1e3:.0f} ms.')
+            elif silence >= self.heartbeat_interval:
+                if not await transport.heartbeat(dead_time - self.heartbeat_interval):
+                    raise CouldNotConnectToDeviceError('ALIVE sin respuesta.')
+
+    def _record_telemetry(self, values: bytes):
+        if len(values) != len(TELEMETRY_FIELDS):
+            return
+
+        timestamp = monotonic()
+
+        self.telemetry.append(timestamp, values)
+
+        if self.telemetry_writer is not None and self.telemetry_writer.write(timestamp, values):
+            self.bridge.spawn(self._flush_telemetry)
+
+    async def _flush_telemetry(self):
+        # Un bloque a la vez: cada escritura vacía la cola completa, en orden
+        async with self._telemetry_flush_lock:
+            try:
+                await trio.to_thread.run_sync(self.telemetry_writer.write_ready)
+            except OSError:
+                # Sin archivo se pierde el registro, pero el enlace sigue
+                pass
+
+    async def _poll_telemetry(self, transport: AsyncSerialTransport):
+        next_poll = trio.current_time()
+
+        while True:
+            self._record_telemetry(await transport.fetch())
+
+            # Ritmo fijo; si una respuesta tardó más que el intervalo no se acumulan pedidos
+            next_poll = max(next_poll + self.telemetry_interval, trio.current_time())
+
+            await trio.sleep_until(next_poll)
+
+    async def _dump_stats(self, transport: AsyncSerialTransport):
+        while True:
+            await trio.sleep(self.stats_interval)
+
+            record = {'port': transport.port_name, **self.stats().to_dict()}
+
+            try:
+                await trio.to_thread.run_sync(append_json_line, self.stats_path, record)
+            except OSError:
+                # Sin archivo no hay registro, pero el enlace sigue
+                return
+
+    def stats(self) -> LinkStatsSnapshot:
+        """ Tiempos de respuesta por tipo de mensaje y contadores del enlace; se puede llamar desde cualquier hilo """
+        return self.link_stats.snapshot()
 
     def sync(self, modulation_index: float):
-        modulation_index = ModulationIndex(int(modulation_index * 100 - 20) / 5)
+        """ Publica el índice de modulación; valores repetidos o muy seguidos se agrupan """
+        if not self.is_connected:
+            return
 
-        if not self.result_queue.empty():
-            result = self.result_queue.get()
+        self.setpoints.post(get_modulation_index(modulation_index))
 
-            if result.value is CouldNotConnectToDeviceError:
-                self.is_connected = False
-                self.port_name = None
+    async def async_sync(self, modulation_index: float, timeout: Optional[float] = None) -> bool:
+        """ Publica el índice y espera el ACK del dispositivo; False si no llegó antes de `timeout` """
+        if not self.is_connected:
+            return False
 
-                self.status = SerialPortStatus.TIMEOUT_ERROR
+        modulation_index = get_modulation_index(modulation_index)
 
-        if self.message_queue.empty() and self.is_connected:
-            message = SerialMessage('sync', (modulation_index,))
+        self.setpoints.post(modulation_index)
 
-            self.message_queue.put(message)
+        with trio.move_on_after(inf if timeout is None else timeout):
+            await self.setpoints.wait_confirmed(modulation_index)
+
+            return True
+
+        return False
+
+    def _detach(self):
+        """ El estado cambia de inmediato; el puerto se cierra después, en el loop de trio """
+        self._generation += 1
 
-    def exit(self):
         self.status = SerialPortStatus.DISCONNECTED
 
         self.is_connected = False
         self.port_name = None
 
-        self.message_queue.put(SerialMessage('exit', None))
+    async def _exit(self):
+        self._stop_reconnect()
+
+        transport, self.transport = self.transport, None
 
+        if transport is None:
+            return
+
+        # Un handshake en curso todavía no es una sesión
+        if self.link_stats.session_start is not None:
+            self.link_stats.session_ended('exit')
+
+        await self._stop_session()
+        await transport.exit()
+
+    async def async_exit(self):
+        """ Como `exit`, para usar desde el loop de trio """
+        self._detach()
+
+        await self._exit()
+
+    def exit(self) -> Optional[Future]:
+        active = self.transport is not None or self._reconnect_scope is not None
+
+        self._detach()
+
+        if not active:
+            return None
 
+        return self.bridge.submit(self._exit)
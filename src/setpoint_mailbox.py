@@ -0,0 +1,174 @@
+from dataclasses import dataclass
+from math import inf
+from threading import Lock
+from typing import Any, Optional
+
+import trio
+
+
+_EMPTY = object()
+
+
+@dataclass(frozen=True)
+class MailboxStats:
+    posted: int
+    sent: int
+    coalesced: int  # Valores reemplazados por uno más nuevo antes de enviarse
+    suppressed: int  # Valores descartados por ser iguales al que tendrá el dispositivo o al pendiente
+
+
+class SetpointMailbox:
+    """
+    Buzón de un solo valor entre la GUI y el loop de trio: siempre se envía el valor
+    más reciente, no se reenvía un valor que el dispositivo ya tiene y entre dos
+    envíos pasan al menos `min_interval` segundos. `post` se puede llamar desde
+    cualquier hilo; `receive`, `sent`, `confirmed` y `failed` desde el loop de trio.
+
+    `sent` marca que el valor salió y `confirmed` que el dispositivo lo aceptó; en
+    modo pregunta/respuesta llegan juntos, con ventana el ACK llega después.
+    """
+
+    def __init__(self, min_interval: float = 0.0):
+        self.min_interval = min_interval
+
+        self._lock = Lock()
+
+        self._pending: Any = _EMPTY
+        self._in_flight: Any = _EMPTY  # Entregado por `receive`, todavía sin `sent` ni `failed`
+        self._last_sent: Any = _EMPTY
+        self._last_confirmed: Any = _EMPTY
+        self._last_send_time = -inf
+
+        self._token: Optional[trio.lowlevel.TrioToken] = None
+        self._wakeup: Optional[trio.Event] = None
+        self._delivered: Optional[trio.Event] = None
+
+        self._posted = 0
+        self._sent = 0
+        self._coalesced = 0
+        self._suppressed = 0
+
+    @property
+    def stats(self) -> MailboxStats:
+        with self._lock:
+            return MailboxStats(self._posted, self._sent, self._coalesced, self._suppressed)
+
+    def reset(self, current_value: Any = _EMPTY):
+        """ Nueva sesión: `current_value` es el valor que el dispositivo ya tiene """
+        with self._lock:
+            self._pending = _EMPTY
+            self._in_flight = _EMPTY
+            self._last_sent = current_value
+            self._last_confirmed = current_value
+            self._last_send_time = -inf
+
+    def get_latest(self) -> Any:
+        """ El valor pendiente, el que está en vuelo o el último enviado; None si no hay ninguno """
+        with self._lock:
+            for value in (self._pending, self._in_flight, self._last_sent):
+                if value is not _EMPTY:
+                    return value
+
+        return None
+
+    def post(self, value: Any):
+        with self._lock:
+            self._posted += 1
+
+            # Valor que tendrá el dispositivo cuando termine el envío en curso, si hay uno
+            current = self._last_sent if self._in_flight is _EMPTY else self._in_flight
+
+            if value == current:
+                # El dispositivo ya tiene este valor: lo pendiente quedó obsoleto
+                if self._pending is _EMPTY:
+                    self._suppressed += 1
+                else:
+                    self._coalesced += 1
+                    self._pending = _EMPTY
+
+                return
+
+            if self._pending is _EMPTY:
+                self._pending = value
+            elif value == self._pending:
+                self._suppressed += 1
+
+                return
+            else:
+                self._coalesced += 1
+                self._pending = value
+
+            token = self._token
+
+        if token is not None:
+            # Thread-safe y no bloquea, también desde el propio hilo de trio
+            token.run_sync_soon(self._wake)
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def receive(self) -> Any:
+        """ Espera un valor pendiente y el intervalo mínimo, y entrega el más reciente """
+        while True:
+            with self._lock:
+                self._token = trio.lowlevel.current_trio_token()
+
+                if self._pending is not _EMPTY:
+                    delay = self._last_send_time + self.min_interval - trio.current_time()
+
+                    if delay <= 0:
+                        value, self._pending = self._pending, _EMPTY
+                        self._in_flight = value
+
+                        return value
+
+                    wakeup = None
+                else:
+                    wakeup = self._wakeup = trio.Event()
+
+            if wakeup is None:
+                # Lo que llegue mientras tanto reemplaza al pendiente
+                await trio.sleep(delay)
+            else:
+                await wakeup.wait()
+
+    def sent(self, value: Any):
+        with self._lock:
+            self._sent += 1
+
+            self._in_flight = _EMPTY
+            self._last_sent = value
+            self._last_send_time = trio.current_time()
+
+    def confirmed(self, value: Any):
+        """ El dispositivo confirmó `value` (ACK) """
+        with self._lock:
+            self._last_confirmed = value
+
+            delivered, self._delivered = self._delivered, None
+
+        if delivered is not None:
+            delivered.set()
+
+    async def wait_confirmed(self, value: Any):
+        """ Espera hasta que `value` sea el último valor confirmado por el dispositivo """
+        while True:
+            with self._lock:
+                if self._last_confirmed == value:
+                    return
+
+                if self._delivered is None:
+                    self._delivered = trio.Event()
+
+                delivered = self._delivered
+
+            await delivered.wait()
+
+    def failed(self, value: Any):
+        """ El envío falló: se reintenta con `value` salvo que ya haya uno más nuevo """
+        with self._lock:
+            self._in_flight = _EMPTY
+
+            if self._pending is _EMPTY:
+                self._pending = value
@@ -0,0 +1,186 @@
+import json
+
+from dataclasses import dataclass
+from hashlib import sha256
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from spwm_cache import get_cache_key, get_cached_tables
+
+
+ANALYSIS_VERSION = 1
+
+DEFAULT_OVERSAMPLING = 64
+DEFAULT_MAX_HARMONIC = 50
+
+# Cada contenido distinto de tablas agrega un espectro; los menos usados se borran
+SPECTRUM_CACHE_MAX_BYTES = 64 << 20
+
+
+class ThdRegressionError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class SpectrumReport:
+    """
+    Espectro de la tensión de salida del puente (normalizada a V_dc), una fila por
+    tabla. `harmonics[:, h]` es la amplitud del armónico h de la frecuencia de salida.
+    """
+    harmonics: np.ndarray
+
+    @property
+    def fundamental(self) -> np.ndarray:
+        return self.harmonics[:, 1]
+
+    @property
+    def thd(self) -> np.ndarray:
+        """ Distorsión armónica total hasta el armónico más alto del reporte """
+        return np.sqrt(np.sum(self.harmonics[:, 2:] ** 2, axis=-1)) / self.fundamental
+
+
+def get_duty_cycles_from_registers(CCPRxL: np.ndarray, CCPxCON: np.ndarray, PR2) -> np.ndarray:
+    """ Versión vectorizada de `pic_formulas.get_duty_cycle_from_CCPRxL_CCPxCON` """
+    CCPRxL = np.asarray(CCPRxL, dtype=np.int64)
+    CCPxCON = np.asarray(CCPxCON, dtype=np.int64)
+
+    return ((CCPRxL << 2) | (CCPxCON & 0b11)) / (4 * (PR2 + 1))
+
+
+def reconstruct_pwm(duty_cycles: np.ndarray, oversampling: int = DEFAULT_OVERSAMPLING) -> np.ndarray:
+    """
+    Tren de pulsos bipolar (+1/-1) de un periodo de salida, con `oversampling`
+    muestras por periodo de conmutación. El PWM del PIC está alineado al inicio del
+    periodo; la muestra donde cae el flanco toma el valor proporcional a la
+    fracción del tiempo en alto, para que el área de cada pulso sea exacta.
+    """
+    duty_cycles = np.atleast_2d(np.asarray(duty_cycles, dtype=float))
+
+    ticks = np.arange(oversampling)
+
+    high = np.clip(duty_cycles[..., np.newaxis] * oversampling - ticks, 0, 1)
+
+    return (2 * high - 1).reshape(duty_cycles.shape[:-1] + (-1,))
+
+
+def get_harmonics(duty_cycles: np.ndarray, oversampling: int, max_harmonic: int) -> np.ndarray:
+    pulses = reconstruct_pwm(duty_cycles, oversampling)
+
+    # La FFT cubre exactamente un periodo de salida, así que el bin h es el armónico h
+    spectrum = np.fft.rfft(pulses, axis=-1)[..., :max_harmonic + 1]
+
+    harmonics = np.abs(spectrum) * 2 / pulses.shape[-1]
+    harmonics[..., 0] /= 2
+
+    return harmonics
+
+
+def analyze_duty_cycles(
+        duty_cycles: np.ndarray,
+        oversampling: int = DEFAULT_OVERSAMPLING,
+        max_harmonic: int = DEFAULT_MAX_HARMONIC,
+        cache_path: Optional[Path] = None
+) -> SpectrumReport:
+    """
+    Espectro de todas las tablas a la vez. Con `cache_path` el resultado se guarda
+    con el hash del contenido de las tablas, así que tablas que no cambian entre
+    ejecuciones no se vuelven a analizar. Los espectros van en `cache_path/spectra`,
+    limitado a SPECTRUM_CACHE_MAX_BYTES.
+    """
+    duty_cycles = np.atleast_2d(np.asarray(duty_cycles, dtype=float))
+
+    def compute():
+        return {'harmonics': get_harmonics(duty_cycles, oversampling, max_harmonic)}
+
+    if cache_path is None:
+        tables = compute()
+    else:
+        key = get_cache_key(analysis_version=ANALYSIS_VERSION,
+                            duty_cycles=sha256(duty_cycles.tobytes()).hexdigest(),
+                            shape=duty_cycles.shape,
+                            oversampling=oversampling,
+                            max_harmonic=max_harmonic)
+
+        tables = get_cached_tables(key, compute, cache_path.joinpath('spectra'), SPECTRUM_CACHE_MAX_BYTES)
+
+    return SpectrumReport(harmonics=tables['harmonics'])
+
+
+def analyze_register_tables(
+        CCPRxL: np.ndarray, CCPxCON: np.ndarray, PR2,
+        oversampling: int = DEFAULT_OVERSAMPLING,
+        max_harmonic: int = DEFAULT_MAX_HARMONIC,
+        cache_path: Optional[Path] = None
+) -> SpectrumReport:
+    """ Espectro de las tablas tal como las entrega `generate_CCPRxL_CCPxCON` """
+    return analyze_duty_cycles(get_duty_cycles_from_registers(CCPRxL, CCPxCON, PR2),
+                               oversampling, max_harmonic, cache_path)
+
+
+def check_thd_regression(
+        report: SpectrumReport,
+        modulation_indices: Iterable[float],
+        baseline_path: Path,
+        configuration: str,
+        tolerance: float = 0.01,
+        update: bool = False
+):
+    """
+    Compara el THD de cada tabla con el guardado en `baseline_path` y lanza
+    ThdRegressionError si alguno empeora más que `tolerance` (relativo). Las
+    referencias se guardan por `configuration` (p. ej. la clave de caché de las
+    entradas del generador) y por índice, así que otra configuración no se compara
+    con estas. El archivo solo se escribe con `update`, que reemplaza la referencia
+    de esta configuración; sin él, los índices sin referencia no se comparan.
+    """
+    baseline_path = Path(baseline_path)
+
+    document = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+
+    if update:
+        document[configuration] = {f'{modulation_index:.4f}': thd
+                                   for modulation_index, thd in zip(modulation_indices, report.thd.tolist())}
+
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(document, indent=4, sort_keys=True))
+
+        return
+
+    baseline = document.get(configuration, {})
+
+    regressions = []
+
+    for modulation_index, thd in zip(modulation_indices, report.thd.tolist()):
+        name = f'{modulation_index:.4f}'
+
+        if name in baseline and thd > baseline[name] * (1 + tolerance):
+            regressions.append(f'M = {name}: THD {100 * thd:.4f} % (referencia {100 * baseline[name]:.4f} %)')
+
+    if regressions:
+        raise ThdRegressionError('THD regressed:\n' + '\n'.join(regressions))
+
+
+if __name__ == "__main__":
+    from time import perf_counter
+
+    from pic_formulas import getPR2value
+    from spwm_engine import get_duty_cycle_matrix, get_CCPRxL_CCPxCON_matrices
+
+    switching_frequency_hz = 40e3
+    output_frequency_hz = 50
+
+    modulation_indices = [mod / 100 for mod in range(20, 96, 5)]
+
+    PR2 = getPR2value(switching_frequency_hz, int(32e6), 1)
+
+    duty_cycles = get_duty_cycle_matrix(switching_frequency_hz, output_frequency_hz, modulation_indices)
+    CCPRxL, CCPxCON = get_CCPRxL_CCPxCON_matrices(PR2, duty_cycles)
+
+    start = perf_counter()
+    report = analyze_register_tables(CCPRxL, CCPxCON, PR2)
+    print(f'Análisis de {len(modulation_indices)} tablas: {perf_counter() - start:.3f} s')
+
+    for M, fundamental, thd in zip(modulation_indices, report.fundamental, report.thd):
+        print(f'M = {M:.2f}: fundamental {fundamental:.4f} V_dc, THD (h <= {DEFAULT_MAX_HARMONIC}) {100 * thd:.4f} %')
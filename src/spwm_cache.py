@@ -0,0 +1,154 @@
+import json
+import os
+
+from hashlib import sha256
+from pathlib import Path
+from typing import Callable, Dict, Optional, TextIO
+
+import numpy as np
+
+
+CACHE_PATH = Path(__file__).parent.joinpath('.spwm_cache')
+
+
+def get_cache_key(**inputs) -> str:
+    """ Hash de las entradas que determinan por completo las tablas generadas """
+    encoded = json.dumps(inputs, sort_keys=True).encode()
+
+    return sha256(encoded).hexdigest()
+
+
+def get_file_digest(path: Path) -> str:
+    digest = sha256()
+
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def load_tables(key: str, cache_path: Path = CACHE_PATH) -> Optional[Dict[str, np.ndarray]]:
+    path = cache_path.joinpath(f'{key}.npz')
+
+    if not path.exists():
+        return None
+
+    # La fecha de modificación marca el último uso, para `prune_tables`
+    os.utime(path)
+
+    with np.load(path) as tables:
+        return {name: tables[name] for name in tables.files}
+
+
+def store_tables(key: str, tables: Dict[str, np.ndarray], cache_path: Path = CACHE_PATH):
+    cache_path.mkdir(parents=True, exist_ok=True)
+
+    # Se escribe a un archivo temporal para no dejar un .npz a medias si se interrumpe
+    tmp_path = cache_path.joinpath(f'{key}.tmp.npz')
+    np.savez(tmp_path, **tables)
+    os.replace(tmp_path, cache_path.joinpath(f'{key}.npz'))
+
+
+def prune_tables(cache_path: Path, max_bytes: int):
+    """ Borra las tablas usadas hace más tiempo hasta que las de `cache_path` ocupen a lo más `max_bytes` """
+    entries = []
+
+    for path in cache_path.glob('*.npz'):
+        if path.name.endswith('.tmp.npz'):
+            continue
+
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def get_cached_tables(
+        key: str,
+        compute: Callable[[], Dict[str, np.ndarray]],
+        cache_path: Path = CACHE_PATH,
+        max_bytes: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Entrega las tablas guardadas bajo `key`, calculándolas solo si no existen. Con
+    `max_bytes`, al guardar se borran las tablas menos usadas de `cache_path`.
+    """
+    tables = load_tables(key, cache_path)
+
+    if tables is None:
+        tables = compute()
+        store_tables(key, tables, cache_path)
+
+        if max_bytes is not None:
+            prune_tables(cache_path, max_bytes)
+
+    return tables
+
+
+def _get_stamp_path(path: Path, key: str, cache_path: Path) -> Path:
+    return cache_path.joinpath(f'{key}.{path.name}.sha256')
+
+
+def is_output_current(path: Path, key: str, cache_path: Path = CACHE_PATH) -> bool:
+    """ Verdadero si `path` ya tiene exactamente el contenido que generarían las entradas de `key` """
+    stamp_path = _get_stamp_path(path, key, cache_path)
+
+    if not path.exists() or not stamp_path.exists():
+        return False
+
+    return stamp_path.read_text() == get_file_digest(path)
+
+
+def write_output(
+        path: Path,
+        key: str,
+        write: Callable[[TextIO], None],
+        cache_path: Path = CACHE_PATH,
+        buffering: int = -1
+) -> bool:
+    """
+    Genera `path` con `write` solo si su contenido cambiaría. Si el resultado es
+    idéntico al archivo existente, este no se reescribe (ni cambia su fecha de
+    modificación). Retorna si el archivo fue modificado.
+    """
+    path = Path(path)
+
+    if is_output_current(path, key, cache_path):
+        return False
+
+    tmp_path = path.with_name(path.name + '.tmp')
+
+    try:
+        with open(tmp_path, 'w', buffering=buffering) as f:
+            write(f)
+
+        digest = get_file_digest(tmp_path)
+
+        if path.exists() and get_file_digest(path) == digest:
+            tmp_path.unlink()
+            changed = False
+        else:
+            os.replace(tmp_path, path)
+            changed = True
+    except BaseException:
+        # Un error a medio escribir (p. ej. opciones inválidas) no deja el .tmp en el proyecto
+        tmp_path.unlink(missing_ok=True)
+
+        raise
+
+    cache_path.mkdir(parents=True, exist_ok=True)
+    _get_stamp_path(path, key, cache_path).write_text(digest)
+
+    return changed
@@ -0,0 +1,155 @@
+from dataclasses import dataclass
+from typing import Iterable, TextIO
+
+import numpy as np
+
+from spwm_engine import get_sin_basis
+from spwm_fixed_point import FixedPointSineBasis, quantize_sine_basis
+
+
+DEFAULT_ACCUMULATOR_BITS = 24
+DEFAULT_TABLE_BITS = 8
+
+
+@dataclass(frozen=True)
+class DdsSimulation:
+    """ Resultado de simular el acumulador de fase, un elemento por frecuencia de salida """
+    target_frequency: np.ndarray
+    phase_increment: np.ndarray
+    achieved_frequency: np.ndarray
+    frequency_error: np.ndarray  # Hz
+    spurious_free_dynamic_range: np.ndarray  # dBc, medido con FFT
+    truncation_noise: np.ndarray  # dBc, potencia del error de fase truncada respecto al seno ideal
+
+    @property
+    def frequency_error_ppm(self) -> np.ndarray:
+        return 1e6 * self.frequency_error / self.target_frequency
+
+
+def get_phase_increments(
+        output_frequencies: Iterable[float],
+        switching_frequency: float,
+        accumulator_bits: int = DEFAULT_ACCUMULATOR_BITS
+) -> np.ndarray:
+    """ Palabra que se suma al acumulador en cada periodo de conmutación """
+    output_frequencies = np.asarray(list(output_frequencies), dtype=float)
+
+    if np.any(output_frequencies >= switching_frequency / 2):
+        raise ValueError('Output frequency must be below half the switching frequency')
+
+    return np.round(output_frequencies * (1 << accumulator_bits) / switching_frequency).astype(np.int64)
+
+
+def get_achieved_frequencies(
+        phase_increments: np.ndarray,
+        switching_frequency: float,
+        accumulator_bits: int = DEFAULT_ACCUMULATOR_BITS
+) -> np.ndarray:
+    return np.asarray(phase_increments) * switching_frequency / (1 << accumulator_bits)
+
+
+def get_dds_sine_basis(PR2: int, table_bits: int = DEFAULT_TABLE_BITS, basis_fraction_bits: int = 15) -> FixedPointSineBasis:
+    """ Tabla de seno de 2^table_bits muestras, escalada igual que en el modo SINE_BASIS """
+    return quantize_sine_basis(get_sin_basis(1 << table_bits), PR2, basis_fraction_bits)
+
+
+def get_dds_table_indices(
+        phase_increments: np.ndarray,
+        n_samples: int,
+        accumulator_bits: int = DEFAULT_ACCUMULATOR_BITS,
+        table_bits: int = DEFAULT_TABLE_BITS
+) -> np.ndarray:
+    """ Índice de tabla que usa el ISR en cada periodo de conmutación (filas: incrementos) """
+    phase_increments = np.asarray(phase_increments, dtype=np.int64)[:, np.newaxis]
+
+    phases = (phase_increments * np.arange(n_samples, dtype=np.int64)) & ((1 << accumulator_bits) - 1)
+
+    return phases >> (accumulator_bits - table_bits)
+
+
+def simulate_dds(
+        output_frequencies: Iterable[float],
+        switching_frequency: float,
+        accumulator_bits: int = DEFAULT_ACCUMULATOR_BITS,
+        table_bits: int = DEFAULT_TABLE_BITS,
+        n_samples: int = 1 << 16
+) -> DdsSimulation:
+    """
+    Simula el acumulador de fase para todas las frecuencias a la vez y mide el error
+    de frecuencia y el costo espectral de truncar la fase a `table_bits` bits.
+    """
+    target_frequency = np.asarray(list(output_frequencies), dtype=float)
+
+    phase_increments = get_phase_increments(target_frequency, switching_frequency, accumulator_bits)
+    achieved_frequency = get_achieved_frequencies(phase_increments, switching_frequency, accumulator_bits)
+
+    n = np.arange(n_samples)
+
+    indices = get_dds_table_indices(phase_increments, n_samples, accumulator_bits, table_bits)
+    truncated = get_sin_basis(1 << table_bits)[indices]
+
+    ideal = np.sin(2 * np.pi * achieved_frequency[:, np.newaxis] * n / switching_frequency)
+
+    error = truncated - ideal
+    truncation_noise = 10 * np.log10(np.mean(error ** 2, axis=-1) / np.mean(ideal ** 2, axis=-1))
+
+    # Ventana Blackman-Harris de 4 términos: lóbulos laterales bajo -92 dB
+    window = get_blackman_harris_window(n_samples)
+    spectrum = np.abs(np.fft.rfft(truncated * window, axis=-1))
+
+    fundamental_bin = np.rint(achieved_frequency * n_samples / switching_frequency).astype(int)
+    bins = np.arange(spectrum.shape[-1])
+
+    # Se excluye el lóbulo principal de la ventana alrededor de la fundamental y DC
+    main_lobe = np.abs(bins - fundamental_bin[:, np.newaxis]) <= 4
+    spurs = np.where(main_lobe | (bins < 4), 0, spectrum)
+
+    fundamental = spectrum[np.arange(len(fundamental_bin)), fundamental_bin]
+    spurious_free_dynamic_range = 20 * np.log10(fundamental / np.maximum(spurs.max(axis=-1), np.finfo(float).tiny))
+
+    return DdsSimulation(
+        target_frequency=target_frequency,
+        phase_increment=phase_increments,
+        achieved_frequency=achieved_frequency,
+        frequency_error=achieved_frequency - target_frequency,
+        spurious_free_dynamic_range=spurious_free_dynamic_range,
+        truncation_noise=truncation_noise
+    )
+
+
+def get_blackman_harris_window(n: int) -> np.ndarray:
+    a0, a1, a2, a3 = 0.35875, 0.48829, 0.14128, 0.01168
+
+    x = 2 * np.pi * np.arange(n) / (n - 1)
+
+    return a0 - a1 * np.cos(x) + a2 * np.cos(2 * x) - a3 * np.cos(3 * x)
+
+
+def write_dds_accessors(sink: TextIO, accumulator_bits: int = DEFAULT_ACCUMULATOR_BITS,
+                        table_bits: int = DEFAULT_TABLE_BITS):
+    """ Macros del acumulador de fase; el índice resultante se usa con SPWM_DUTY_VALUE """
+    sink.write('#define SPWM_DDS 1\n')
+    sink.write(f'#define SPWM_DDS_ACCUMULATOR_BITS {accumulator_bits}\n')
+    sink.write(f'#define SPWM_DDS_TABLE_BITS {table_bits}\n')
+    sink.write(f'#define SPWM_DDS_ACCUMULATOR_MASK {(1 << accumulator_bits) - 1}UL\n\n')
+
+    sink.write('#define SPWM_DDS_STEP(phase, increment) (((phase) + (increment)) & SPWM_DDS_ACCUMULATOR_MASK)\n')
+    sink.write('#define SPWM_DDS_INDEX(phase) '
+               '((uint16_t) ((phase) >> (SPWM_DDS_ACCUMULATOR_BITS - SPWM_DDS_TABLE_BITS)))\n\n')
+
+
+if __name__ == "__main__":
+    switching_frequency_hz = 40e3
+
+    output_frequencies = [10, 25, 47.5, 50, 60, 100, 400]
+
+    for table_bits in (6, 8, 10):
+        simulation = simulate_dds(output_frequencies, switching_frequency_hz, table_bits=table_bits)
+
+        print(f'Tabla de {1 << table_bits} muestras:')
+
+        for i, frequency in enumerate(simulation.target_frequency):
+            print(f'  {frequency:6.1f} Hz: incremento {simulation.phase_increment[i]:7d}, '
+                  f'error {simulation.frequency_error_ppm[i]:+8.3f} ppm, '
+                  f'SFDR {simulation.spurious_free_dynamic_range[i]:5.1f} dBc, '
+                  f'ruido de truncamiento {simulation.truncation_noise[i]:6.1f} dBc')
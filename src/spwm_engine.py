@@ -0,0 +1,111 @@
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+
+def get_sample_count(switching_frequency: float, output_frequency: float) -> int:
+    """ Número de muestras por periodo de la señal de salida """
+    return int(switching_frequency / output_frequency)
+
+
+def get_sin_basis(N: int) -> np.ndarray:
+    """ Un periodo de sin(2πk/N), k = 0..N-1 """
+    k = np.arange(N)
+
+    return np.sin(2 * np.pi * k / N)
+
+
+def get_sample_pair_indices(N: int) -> np.ndarray:
+    """
+    Índice de la primera de las dos muestras de seno que promedia cada ciclo de
+    trabajo. La última muestra reutiliza las dos primeras, igual que el cálculo
+    escalar de `spwm_table_generator.get_duty_cycle_samples`.
+    """
+    k = np.arange(N)
+    k[-1] = 0
+
+    return k
+
+
+def get_duty_cycle_matrix(
+        switching_frequency: float,
+        output_frequency: float,
+        modulation_indices: Iterable[float],
+        sample_count: Optional[int] = None
+) -> np.ndarray:
+    """
+    Calcula los ciclos de trabajo de todos los índices de modulación en una sola
+    pasada. Cada fila corresponde a un índice de modulación y es idéntica a lo que
+    entrega `spwm_table_generator.get_duty_cycle_samples` para ese índice.
+
+    Con `sample_count` las tablas tienen exactamente ese largo; si no, se deriva de
+    las frecuencias, y una frecuencia de salida calculada como F_PWM / N puede dar
+    N - 1 por redondeo.
+    """
+    N = get_sample_count(switching_frequency, output_frequency) if sample_count is None else sample_count
+
+    switching_period = 1 / switching_frequency
+
+    sin_samples = get_sin_basis(N)
+
+    k = get_sample_pair_indices(N)
+
+    M = np.asarray(list(modulation_indices), dtype=float)[:, np.newaxis]
+
+    t_on1 = (switching_period / 4) * (1 + M * sin_samples[k])
+    t_on2 = (switching_period / 4) * (1 + M * sin_samples[k + 1])
+
+    t_on = t_on1 + t_on2
+
+    return t_on / switching_period
+
+
+def get_CCPRxL_CCPxCON_matrices(PR2_value, duty_cycles: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Versión vectorizada de `pic_formulas.getCCPRxL_CCPxCON`: obtiene los valores de
+    CCPRxL y CCPxCON<5:4> para cada ciclo de trabajo de la matriz.
+    """
+    duty_cycles = np.asarray(duty_cycles, dtype=float)
+
+    if np.any(duty_cycles > 1):
+        raise ValueError('Duty cycle cannot exceed 1')
+
+    if np.any(duty_cycles < 0):
+        raise ValueError('Duty cycle cannot be negative')
+
+    # Latex: \text{CCPRxL}|\text{CCPxCON}_{\text{5:4}} = 4 \cdot D \cdot [PR2 + 1]
+    result = ((PR2_value + 1) * 4 * duty_cycles).astype(np.int64)
+    CCPRxL = result >> 2
+    CCPxCON = result & 0b11
+
+    return CCPRxL, CCPxCON
+
+
+if __name__ == "__main__":
+    from time import perf_counter
+
+    from pic_formulas import getPR2value, getCCPRxL_CCPxCON
+    from spwm_table_generator import get_duty_cycle_samples
+
+    switching_frequency_hz = 40e3
+    output_frequency_hz = 10
+    modulation_indices = [mod / 100 for mod in range(20, 96, 5)]
+
+    PR2 = getPR2value(switching_frequency_hz, int(32e6), 1)
+
+    start = perf_counter()
+    duty_cycles = get_duty_cycle_matrix(switching_frequency_hz, output_frequency_hz, modulation_indices)
+    CCPRxL, CCPxCON = get_CCPRxL_CCPxCON_matrices(PR2, duty_cycles)
+    print(f'Vectorizado: {perf_counter() - start:.4f} s')
+
+    start = perf_counter()
+    scalar = [[getCCPRxL_CCPxCON(PR2, d) for d in get_duty_cycle_samples(switching_frequency_hz, output_frequency_hz, M)]
+              for M in modulation_indices]
+    print(f'Escalar: {perf_counter() - start:.4f} s')
+
+    assert np.array_equal(np.stack([CCPRxL, CCPxCON], axis=-1), np.array(scalar))
+    print('Las tablas coinciden con el cálculo escalar.')
+
+    # 32 MHz, prescaler 4, PR2 49: 40 kHz / 816 no vuelve a dar 816 muestras
+    assert get_sample_count(40e3, 40e3 / 816) == 815
+    assert get_duty_cycle_matrix(40e3, 40e3 / 816, [0.5], sample_count=816).shape == (1, 816)
@@ -0,0 +1,149 @@
+from dataclasses import dataclass
+from math import floor, log2
+from typing import Iterable, TextIO
+
+import numpy as np
+
+from spwm_engine import get_sample_count, get_sin_basis, get_sample_pair_indices
+
+
+# El índice de modulación se transmite al dispositivo en Q15 (M = 1.0 -> 32768)
+MODULATION_INDEX_FRACTION_BITS = 15
+
+MAX_AMPLITUDE = 0xFFFF
+
+
+@dataclass(frozen=True)
+class FixedPointSineBasis:
+    """
+    Tabla única de seno en punto fijo y las constantes con las que el ISR obtiene
+    el valor de 10 bits de CCPRxL:CCPxCON<5:4> para cualquier índice de modulación:
+
+        amplitud = (M_q15 * full_scale_amplitude) >> 15          (una vez por cambio de M)
+        valor = offset + ((basis[k] * amplitud) >> (basis_fraction_bits + amplitude_fraction_bits))
+    """
+    basis: np.ndarray
+    basis_fraction_bits: int
+    amplitude_fraction_bits: int
+    offset: int
+    full_scale_amplitude: int
+
+    @property
+    def c_type(self) -> str:
+        return 'int16_t' if self.basis_fraction_bits > 7 else 'int8_t'
+
+
+def quantize_sine_basis(b: np.ndarray, PR2: int, basis_fraction_bits: int = 15) -> FixedPointSineBasis:
+    """ Lleva una tabla de seno en [-1, 1] a punto fijo junto con las constantes de escala para PR2 """
+    if basis_fraction_bits not in (7, 15):
+        raise ValueError('The sine basis must be Q7 (int8_t) or Q15 (int16_t)')
+
+    if PR2 != int(PR2):
+        raise ValueError(f'The fixed-point sine basis requires an integer PR2 (PR2 = {PR2})')
+
+    full_scale = 1 << basis_fraction_bits
+    dtype = np.int16 if basis_fraction_bits > 7 else np.int8
+
+    basis = np.clip(np.round(b * full_scale), -(full_scale - 1), full_scale - 1).astype(dtype)
+
+    # Amplitud de M = 1 en registros: 4 * (PR2 + 1) / 2, con tantos bits fraccionarios como quepan en 16 bits
+    half_range = 2 * (int(PR2) + 1)
+    amplitude_fraction_bits = floor(log2(MAX_AMPLITUDE / half_range))
+
+    return FixedPointSineBasis(
+        basis=basis,
+        basis_fraction_bits=basis_fraction_bits,
+        amplitude_fraction_bits=amplitude_fraction_bits,
+        offset=half_range,
+        full_scale_amplitude=half_range << amplitude_fraction_bits
+    )
+
+
+def get_fixed_point_sine_basis(
+        switching_frequency: float,
+        output_frequency: float,
+        PR2: int,
+        basis_fraction_bits: int = 15
+) -> FixedPointSineBasis:
+    N = get_sample_count(switching_frequency, output_frequency)
+
+    sin_samples = get_sin_basis(N)
+    k = get_sample_pair_indices(N)
+
+    # Promedio de las dos muestras de seno de cada periodo de conmutación: D = 1/2 + (M / 2) * b
+    b = (sin_samples[k] + sin_samples[k + 1]) / 2
+
+    return quantize_sine_basis(b, PR2, basis_fraction_bits)
+
+
+def get_modulation_index_q15(modulation_indices) -> np.ndarray:
+    """ Índice de modulación tal como se le envía al dispositivo """
+    M = np.asarray(modulation_indices, dtype=float)
+
+    if np.any((M < 0) | (M > 1)):
+        raise ValueError('Modulation index must be between 0 and 1')
+
+    return np.round(M * (1 << MODULATION_INDEX_FRACTION_BITS)).astype(np.int64)
+
+
+def get_amplitudes(sine_basis: FixedPointSineBasis, modulation_indices) -> np.ndarray:
+    M_q15 = get_modulation_index_q15(modulation_indices)
+
+    return (M_q15 * sine_basis.full_scale_amplitude) >> MODULATION_INDEX_FRACTION_BITS
+
+
+def get_fixed_point_duty_values(sine_basis: FixedPointSineBasis, modulation_indices: Iterable[float]) -> np.ndarray:
+    """
+    Modelo bit a bit del cálculo del ISR: valor de 10 bits de CCPRxL:CCPxCON<5:4>
+    para cada índice de modulación (filas) y muestra (columnas).
+    """
+    amplitudes = get_amplitudes(sine_basis, list(modulation_indices))[:, np.newaxis]
+
+    shift = sine_basis.basis_fraction_bits + sine_basis.amplitude_fraction_bits
+
+    # El desplazamiento a la derecha de numpy es aritmético, igual que en XC8
+    return sine_basis.offset + ((sine_basis.basis.astype(np.int64) * amplitudes) >> shift)
+
+
+def write_fixed_point_accessors(sink: TextIO, sine_basis: FixedPointSineBasis):
+    """ Constantes y macros con las que el ISR escala la tabla `sine_basis` """
+    sink.write('#define SPWM_SINE_BASIS 1\n')
+    sink.write(f'#define SPWM_SINE_BASIS_FRACTION_BITS {sine_basis.basis_fraction_bits}\n')
+    sink.write(f'#define SPWM_AMPLITUDE_FRACTION_BITS {sine_basis.amplitude_fraction_bits}\n')
+    sink.write(f'#define SPWM_OFFSET {sine_basis.offset}\n')
+    sink.write(f'#define SPWM_FULL_SCALE_AMPLITUDE {sine_basis.full_scale_amplitude}UL\n\n')
+
+    # Se calcula una sola vez cada vez que cambia M
+    sink.write('#define SPWM_AMPLITUDE(m_q15) '
+               f'((uint16_t) (((uint32_t) (m_q15) * SPWM_FULL_SCALE_AMPLITUDE) >> {MODULATION_INDEX_FRACTION_BITS}))\n')
+
+    # Una multiplicación y un desplazamiento por interrupción
+    sink.write('#define SPWM_DUTY_VALUE(amplitude, k) ((uint16_t) (SPWM_OFFSET + '
+               '(((int32_t) sine_basis[k] * (int32_t) (amplitude)) >> '
+               '(SPWM_SINE_BASIS_FRACTION_BITS + SPWM_AMPLITUDE_FRACTION_BITS))))\n')
+    sink.write('#define SPWM_CCPRXL_FROM_DUTY(value) ((uint8_t) ((value) >> 2))\n')
+    sink.write('#define SPWM_CCPXCON_FROM_DUTY(value) ((uint8_t) ((value) & 3))\n\n')
+
+
+if __name__ == "__main__":
+    from pic_formulas import getPR2value
+    from spwm_engine import get_duty_cycle_matrix, get_CCPRxL_CCPxCON_matrices
+
+    switching_frequency_hz = 40e3
+    output_frequency_hz = 100
+
+    PR2 = getPR2value(switching_frequency_hz, int(32e6), 1)
+
+    modulation_indices = np.linspace(0, 1, 1001)
+
+    CCPRxL, CCPxCON = get_CCPRxL_CCPxCON_matrices(
+        PR2, get_duty_cycle_matrix(switching_frequency_hz, output_frequency_hz, modulation_indices))
+    float_values = (CCPRxL << 2) | CCPxCON
+
+    for basis_fraction_bits in (15, 7):
+        sine_basis = get_fixed_point_sine_basis(switching_frequency_hz, output_frequency_hz, PR2, basis_fraction_bits)
+
+        error = get_fixed_point_duty_values(sine_basis, modulation_indices) - float_values
+
+        print(f'Q{basis_fraction_bits}: error máximo {np.abs(error).max()} LSB, '
+              f'error medio {error.mean():+.4f} LSB')
@@ -0,0 +1,143 @@
+from dataclasses import dataclass
+from enum import Enum, auto
+from typing import Tuple
+
+import numpy as np
+
+
+# Armónicos bajos que se consideran al medir el error de cuantización
+MAX_HARMONIC = 50
+
+
+class QuantizationMethod(Enum):
+    TRUNCATE = auto()  # int() de pic_formulas.getCCPRxL_CCPxCON, sesgado hacia abajo
+    ROUND = auto()  # Redondeo al valor más cercano
+    ERROR_FEEDBACK = auto()  # Redondeo con realimentación del error (sigma-delta de primer orden)
+    SIGMA_DELTA = auto()  # Modelado de ruido de segundo orden
+
+
+@dataclass(frozen=True)
+class QuantizationReport:
+    """ Error de cuantización de cada tabla, en LSB del valor de 10 bits """
+    dc_offset: np.ndarray
+    fundamental_error: np.ndarray  # Error de amplitud de la fundamental
+    harmonic_error: np.ndarray  # Valor RMS del error en los armónicos 2..MAX_HARMONIC
+
+
+def get_register_range(PR2) -> Tuple[float, int]:
+    """ Escala y valor máximo del valor de 10 bits CCPRxL:CCPxCON<5:4> """
+    scale = (PR2 + 1) * 4
+
+    return scale, min(int(scale), 0x3FF)
+
+
+def _quantize_with_feedback(targets: np.ndarray, maximum: int, order: int) -> np.ndarray:
+    """
+    Cuantiza cada fila arrastrando el error hacia las muestras siguientes. Se hace
+    una primera pasada para que el estado del filtro al inicio sea el mismo que al
+    final del periodo, ya que la tabla se recorre en forma circular.
+    """
+    rows, N = targets.shape
+
+    values = np.empty((rows, N), dtype=np.int64)
+
+    errors = np.zeros((rows, order))
+
+    for _ in range(2):
+        for k in range(N):
+            if order == 1:
+                desired = targets[:, k] + errors[:, 0]
+            else:
+                desired = targets[:, k] + 2 * errors[:, 0] - errors[:, 1]
+
+            values[:, k] = np.clip(np.round(desired), 0, maximum)
+
+            errors[:, 1:] = errors[:, :-1]
+            errors[:, 0] = desired - values[:, k]
+
+    return values
+
+
+def quantize_duty_cycles(PR2, duty_cycles: np.ndarray, method: QuantizationMethod) -> np.ndarray:
+    """ Valor de 10 bits de CCPRxL:CCPxCON<5:4> para cada ciclo de trabajo de la matriz """
+    duty_cycles = np.atleast_2d(np.asarray(duty_cycles, dtype=float))
+
+    if np.any(duty_cycles > 1):
+        raise ValueError('Duty cycle cannot exceed 1')
+
+    if np.any(duty_cycles < 0):
+        raise ValueError('Duty cycle cannot be negative')
+
+    scale, maximum = get_register_range(PR2)
+
+    targets = scale * duty_cycles
+
+    if method == QuantizationMethod.TRUNCATE:
+        return targets.astype(np.int64)
+    elif method == QuantizationMethod.ROUND:
+        return np.clip(np.round(targets), 0, maximum).astype(np.int64)
+    elif method == QuantizationMethod.ERROR_FEEDBACK:
+        return _quantize_with_feedback(targets, maximum, order=1)
+    else:
+        return _quantize_with_feedback(targets, maximum, order=2)
+
+
+def get_quantization_report(PR2, duty_cycles: np.ndarray, values: np.ndarray) -> QuantizationReport:
+    duty_cycles = np.atleast_2d(np.asarray(duty_cycles, dtype=float))
+
+    scale, _ = get_register_range(PR2)
+
+    error = np.atleast_2d(values) - scale * duty_cycles
+
+    N = error.shape[-1]
+
+    spectrum = np.fft.rfft(error, axis=-1) * 2 / N
+    harmonics = spectrum[:, 2:MAX_HARMONIC + 1]
+
+    return QuantizationReport(
+        dc_offset=error.mean(axis=-1),
+        fundamental_error=np.abs(spectrum[:, 1]),
+        harmonic_error=np.sqrt(np.sum(np.abs(harmonics) ** 2, axis=-1) / 2)
+    )
+
+
+def optimize_duty_tables(
+        PR2, duty_cycles: np.ndarray, method: QuantizationMethod
+) -> Tuple[np.ndarray, np.ndarray, QuantizationReport, QuantizationReport]:
+    """
+    Tablas CCPRxL y CCPxCON cuantizadas con `method`, junto con el reporte de error
+    antes (truncamiento) y después de optimizar.
+    """
+    before = get_quantization_report(PR2, duty_cycles,
+                                     quantize_duty_cycles(PR2, duty_cycles, QuantizationMethod.TRUNCATE))
+
+    values = quantize_duty_cycles(PR2, duty_cycles, method)
+    after = get_quantization_report(PR2, duty_cycles, values)
+
+    return values >> 2, values & 0b11, before, after
+
+
+if __name__ == "__main__":
+    from pic_formulas import getPR2value
+    from spwm_engine import get_duty_cycle_matrix
+
+    switching_frequency_hz = 40e3
+    output_frequency_hz = 50
+
+    modulation_indices = [mod / 100 for mod in range(20, 96, 5)]
+
+    # PR2 pequeño: pocos bits de resolución, donde más se nota la cuantización
+    PR2 = getPR2value(switching_frequency_hz, int(8e6), 1)
+
+    duty_cycles = get_duty_cycle_matrix(switching_frequency_hz, output_frequency_hz, modulation_indices)
+
+    for method in QuantizationMethod:
+        _, _, before, after = optimize_duty_tables(PR2, duty_cycles, method)
+
+        print(f'{method.name}:')
+
+        for i in range(0, len(modulation_indices), 5):
+            M = modulation_indices[i]
+
+            print(f'  M = {M:.2f}: DC {before.dc_offset[i]:+.3f} -> {after.dc_offset[i]:+.3f} LSB, '
+                  f'armónicos {before.harmonic_error[i]:.4f} -> {after.harmonic_error[i]:.4f} LSB')
@@ -0,0 +1,68 @@
+from typing import TextIO
+
+import numpy as np
+
+
+SAMPLES_PER_BYTE = 4
+
+
+def pack_CCPxCON(CCPxCON: np.ndarray) -> np.ndarray:
+    """
+    Empaqueta los bits CCPxCON<5:4> de cuatro muestras en cada byte. La muestra i
+    queda en los bits 2 * (i % 4) y 2 * (i % 4) + 1 del byte i // 4.
+    """
+    CCPxCON = np.asarray(CCPxCON)
+
+    if np.any((CCPxCON < 0) | (CCPxCON > 0b11)):
+        raise ValueError('CCPxCON values must fit in 2 bits')
+
+    n = CCPxCON.shape[-1]
+    padding = -n % SAMPLES_PER_BYTE
+
+    padded = np.zeros(CCPxCON.shape[:-1] + (n + padding,), dtype=np.uint8)
+    padded[..., :n] = CCPxCON
+
+    fields = padded.reshape(CCPxCON.shape[:-1] + (-1, SAMPLES_PER_BYTE))
+    shifts = np.arange(SAMPLES_PER_BYTE, dtype=np.uint8) * 2
+
+    return np.bitwise_or.reduce(fields << shifts, axis=-1).astype(np.uint8)
+
+
+def unpack_CCPxCON(packed: np.ndarray, n: int) -> np.ndarray:
+    """ Inverso de `pack_CCPxCON`: entrega las primeras `n` muestras """
+    packed = np.asarray(packed, dtype=np.uint8)
+
+    shifts = np.arange(SAMPLES_PER_BYTE, dtype=np.uint8) * 2
+
+    fields = (packed[..., np.newaxis] >> shifts) & 0b11
+
+    return fields.reshape(packed.shape[:-1] + (-1,))[..., :n]
+
+
+def get_packed_table_size(n: int) -> int:
+    return -(-n // SAMPLES_PER_BYTE)
+
+
+def write_packed_accessors(sink: TextIO):
+    """ Macro para leer los bits CCPxCON<5:4> de la muestra almacenada i """
+    sink.write('#define SPWM_PACKED_CCPXCON 1\n')
+    sink.write('#define SPWM_CCPXCON_AT(table, i) (((table)[(i) >> 2] >> (((i) & 3) << 1)) & 3)\n\n')
+
+
+if __name__ == "__main__":
+    from pic_formulas import getPR2value, getCCPRxL_CCPxCON
+    from spwm_engine import get_duty_cycle_matrix, get_CCPRxL_CCPxCON_matrices
+
+    PR2 = getPR2value(40e3, int(32e6), 1)
+
+    duty_cycles = get_duty_cycle_matrix(40e3, 100, [mod / 100 for mod in range(20, 96, 5)])
+    CCPRxL, CCPxCON = get_CCPRxL_CCPxCON_matrices(PR2, duty_cycles)
+
+    packed = pack_CCPxCON(CCPxCON)
+    unpacked = unpack_CCPxCON(packed, CCPxCON.shape[-1])
+
+    expected = np.array([[getCCPRxL_CCPxCON(PR2, d)[1] for d in row] for row in duty_cycles])
+
+    assert np.array_equal(unpacked, expected)
+
+    print(f'Bytes por tabla: {2 * CCPxCON.shape[-1]} -> {CCPxCON.shape[-1] + packed.shape[-1]}')
@@ -0,0 +1,116 @@
+from typing import TextIO, Tuple
+
+import numpy as np
+
+from spwm_engine import get_sample_pair_indices
+
+
+def get_quarter_wave_indices(N: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Para cada muestra k del periodo completo, entrega el índice dentro del primer
+    cuarto de onda y si la muestra pertenece al semiciclo negativo.
+    """
+    if N % 4:
+        raise ValueError(f'SPWM table size must be a multiple of 4 for quarter-wave compression (N = {N})')
+
+    half = N // 2
+    quarter = N // 4
+
+    # La última muestra de la tabla repite la primera
+    k = get_sample_pair_indices(N)
+
+    k_half = k % half
+
+    quarter_index = np.where(k_half < quarter, k_half, half - 1 - k_half)
+    is_negative_half = k >= half
+
+    return quarter_index, is_negative_half
+
+
+def expand_quarter_wave(
+        CCPRxL_quarter: np.ndarray, CCPxCON_quarter: np.ndarray, N: int, PR2: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reconstruye las tablas de periodo completo a partir del primer cuarto de onda,
+    igual que lo hacen las macros SPWM_CCPRXL/SPWM_CCPXCON en el ISR. En el
+    semiciclo negativo el valor de 10 bits es 4 * (PR2 + 1) - 1 - valor, es decir,
+    CCPRxL = PR2 - CCPRxL y CCPxCON = 3 - CCPxCON.
+    """
+    quarter_index, is_negative_half = get_quarter_wave_indices(N)
+
+    CCPRxL_quarter = np.asarray(CCPRxL_quarter)
+    CCPxCON_quarter = np.asarray(CCPxCON_quarter)
+
+    CCPRxL = CCPRxL_quarter[..., quarter_index]
+    CCPxCON = CCPxCON_quarter[..., quarter_index]
+
+    CCPRxL = np.where(is_negative_half, PR2 - CCPRxL, CCPRxL)
+    CCPxCON = np.where(is_negative_half, 0b11 - CCPxCON, CCPxCON)
+
+    return CCPRxL, CCPxCON
+
+
+def compress_quarter_wave(CCPRxL: np.ndarray, CCPxCON: np.ndarray, PR2: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Entrega solo el primer cuarto de onda de cada tabla. Lanza ValueError si la
+    expansión no reproduce las tablas originales muestra a muestra (por ejemplo,
+    con un PR2 no entero).
+    """
+    CCPRxL = np.asarray(CCPRxL)
+    CCPxCON = np.asarray(CCPxCON)
+
+    N = CCPRxL.shape[-1]
+
+    if PR2 != int(PR2):
+        raise ValueError(f'Quarter-wave compression requires an integer PR2 (PR2 = {PR2})')
+
+    PR2 = int(PR2)
+
+    CCPRxL_quarter = CCPRxL[..., :N // 4]
+    CCPxCON_quarter = CCPxCON[..., :N // 4]
+
+    expanded_CCPRxL, expanded_CCPxCON = expand_quarter_wave(CCPRxL_quarter, CCPxCON_quarter, N, PR2)
+
+    if not (np.array_equal(expanded_CCPRxL, CCPRxL) and np.array_equal(expanded_CCPxCON, CCPxCON)):
+        raise ValueError('Tables are not quarter-wave symmetric')
+
+    return CCPRxL_quarter, CCPxCON_quarter
+
+
+def write_quarter_wave_accessors(sink: TextIO, PR2: int):
+    """
+    Macros que usa el ISR para leer la muestra k del periodo completo. Requiere
+    que SPWM_CCPXCON_AT ya esté definida.
+    """
+    sink.write('#define SPWM_QUARTER_WAVE 1\n')
+    sink.write(f'#define SPWM_PR2 {int(PR2)}\n')
+    sink.write('#define SPWM_HALF_TABLE_SIZE (SPWM_TABLE_SIZE / 2)\n')
+    sink.write('#define SPWM_QUARTER_TABLE_SIZE (SPWM_TABLE_SIZE / 4)\n\n')
+
+    sink.write('#define SPWM_SAMPLE_INDEX(k) ((k) == SPWM_TABLE_SIZE - 1 ? 0 : (k))\n')
+    sink.write('#define SPWM_HALF_INDEX(k) (SPWM_SAMPLE_INDEX(k) % SPWM_HALF_TABLE_SIZE)\n')
+    sink.write('#define SPWM_QUARTER_INDEX(k) (SPWM_HALF_INDEX(k) < SPWM_QUARTER_TABLE_SIZE ? '
+               'SPWM_HALF_INDEX(k) : SPWM_HALF_TABLE_SIZE - 1 - SPWM_HALF_INDEX(k))\n')
+    sink.write('#define SPWM_IS_NEGATIVE_HALF(k) (SPWM_SAMPLE_INDEX(k) >= SPWM_HALF_TABLE_SIZE)\n\n')
+
+    sink.write('#define SPWM_CCPRXL(table, k) (SPWM_IS_NEGATIVE_HALF(k) ? '
+               '(uint8_t) (SPWM_PR2 - (table)[SPWM_QUARTER_INDEX(k)]) : (table)[SPWM_QUARTER_INDEX(k)])\n')
+    sink.write('#define SPWM_CCPXCON(table, k) (SPWM_IS_NEGATIVE_HALF(k) ? '
+               '(uint8_t) (3 - SPWM_CCPXCON_AT(table, SPWM_QUARTER_INDEX(k))) : SPWM_CCPXCON_AT(table, SPWM_QUARTER_INDEX(k)))\n\n')
+
+
+if __name__ == "__main__":
+    from pic_formulas import getPR2value
+    from spwm_table_generator import MODULATION_INDICES, get_CCPRxL_CCPxCON_tables
+
+    switching_frequency_hz = 40e3
+    output_frequency_hz = 100
+    F_osc = int(32e6)
+
+    PR2 = getPR2value(switching_frequency_hz, F_osc, 1)
+
+    CCPRxL, CCPxCON = get_CCPRxL_CCPxCON_tables(F_osc, switching_frequency_hz, output_frequency_hz, MODULATION_INDICES)
+    CCPRxL_quarter, CCPxCON_quarter = compress_quarter_wave(CCPRxL, CCPxCON, PR2)
+
+    print(f'Muestras por tabla: {CCPRxL.shape[-1]} -> {CCPRxL_quarter.shape[-1]}')
+    print('La expansión coincide con las tablas completas.')
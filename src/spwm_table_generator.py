@@ -1,15 +1,43 @@
 from math import sin, pi
 
-from itertools import tee
-from dataclasses import dataclass
-from typing import Iterable
-
-from pic_formulas import getPR2value, getCCPRxL_CCPxCON
+from dataclasses import asdict, dataclass, fields
+from io import StringIO
+from itertools import islice
+from enum import Enum, auto
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple
+
+import numpy as np
+
+from pwm_frequency_index import get_pwm_configuration
+from spwm_analysis import analyze_duty_cycles, analyze_register_tables, check_thd_regression
+from spwm_cache import CACHE_PATH, get_cache_key, get_cached_tables, write_output
+from spwm_engine import get_duty_cycle_matrix, get_CCPRxL_CCPxCON_matrices
+from spwm_dds import DEFAULT_ACCUMULATOR_BITS, DEFAULT_TABLE_BITS, get_dds_sine_basis, get_phase_increments, write_dds_accessors
+from spwm_fixed_point import (
+    FixedPointSineBasis, get_fixed_point_duty_values, get_fixed_point_sine_basis, get_modulation_index_q15,
+    write_fixed_point_accessors
+)
+from spwm_optimizer import QuantizationMethod, QuantizationReport, optimize_duty_tables
+from spwm_packing import pack_CCPxCON, write_packed_accessors
+from spwm_quarter_wave import compress_quarter_wave, write_quarter_wave_accessors
+from spwm_three_phase import write_three_phase_accessors
 
 from pathlib import Path
 
 MPLAB_PROJECT_PATH = Path('C:\\Users\\duskje\\MPLABXProjects\\Prototipo-Inversor.X')
 
+# Junto al caché, fuera del control de versiones; solo se escribe con --update-baseline
+THD_BASELINE_PATH = CACHE_PATH.joinpath('thd_baseline.json')
+
+# Se debe incrementar cada vez que cambie el contenido de los archivos generados
+GENERATOR_VERSION = 5
+
+MODULATION_INDICES = [mod / 100 for mod in range(20, 96, 5)]
+
+VALUES_PER_LINE = 16
+WRITE_BUFFER_SIZE = 1 << 16
+
+
 @dataclass(frozen=True)
 class PicPwmConfig:
     switching_frequency_hz: int # F_PWM in the datasheet
@@ -17,18 +45,42 @@ class PicPwmConfig:
     TMR2_prescaler: int
 
 
-def generate_program_memory_table(type: str, variable_name: str, data: Iterable):
-    data = list(data)
+def write_initializer_list(sink: TextIO, data: Iterable, values_per_line: int = VALUES_PER_LINE):
+    """
+    Escribe los elementos de `data` separados por comas, `values_per_line` por línea,
+    directamente en `sink` sin armar el arreglo completo en memoria.
+    """
+    data = iter(data)
+
+    separator = ""
+
+    while True:
+        chunk = list(islice(data, values_per_line))
+
+        if not chunk:
+            break
 
-    result = f"const {type} {variable_name} [] = {{\n"
+        sink.write(separator)
+        sink.write(", ".join(map(str, chunk)))
 
-    for datum in data[:-1]:
-        result += str(datum) + ",\n"
+        separator = ",\n"
 
-    result += str(data[-1]) + "\n"
-    result += "};\n\n"
+    sink.write("\n")
 
-    return result
+
+def write_program_memory_table(sink: TextIO, type: str, variable_name: str, data: Iterable,
+                               values_per_line: int = VALUES_PER_LINE):
+    sink.write(f"const {type} {variable_name} [] = {{\n")
+    write_initializer_list(sink, data, values_per_line)
+    sink.write("};\n\n")
+
+
+def generate_program_memory_table(type: str, variable_name: str, data: Iterable):
+    result = StringIO()
+
+    write_program_memory_table(result, type, variable_name, data)
+
+    return result.getvalue()
 
 
 def generate_sin_table(switching_frequency: float, output_frequency:float):
@@ -39,89 +91,428 @@ def generate_sin_table(switching_frequency: float, output_frequency:float):
     return generate_program_memory_table('float', 'sin_samples', sin_samples)
 
 
+def write_init_duty_cycle_table(sink: TextIO, switching_frequency: float, output_frequency: float):
+    duty_cycle_samples = get_duty_cycle_matrix(switching_frequency, output_frequency, [0.5])[0]
+
+    write_program_memory_table(sink, 'float', 'duty_cycle_samples_on_init', duty_cycle_samples.tolist())
+
+
 def generate_init_duty_cycle_table(switching_frequency: float, output_frequency: float):
-    result = "const float duty_cycle_samples_on_init [] = {\n"
+    result = StringIO()
+
+    write_init_duty_cycle_table(result, switching_frequency, output_frequency)
+
+    return result.getvalue()
+
+
+def get_CCPRxL_CCPxCON_tables(
+        F_osc: int, switching_frequency: float,
+        output_frequency: float,
+        modulation_indices: Iterable[float],
+        TMR2_prescaler: int = 1,
+        cache_path: Optional[Path] = None,
+        quantization: QuantizationMethod = QuantizationMethod.TRUNCATE
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Matrices de CCPRxL y CCPxCON (una fila por índice de modulación). Si se entrega
+    `cache_path`, las tablas se leen del caché cuando las entradas no han cambiado.
+    Con `quantization` distinto de TRUNCATE, el error de cuantización se reparte a
+    lo largo del periodo (ver spwm_optimizer).
+    """
+    tables = _get_tables(F_osc, switching_frequency, output_frequency, modulation_indices, TMR2_prescaler,
+                         cache_path, quantization)
+
+    return tables['CCPRxL'], tables['CCPxCON']
+
+
+def get_quantization_reports(
+        F_osc: int, switching_frequency: float,
+        output_frequency: float,
+        modulation_indices: Iterable[float],
+        TMR2_prescaler: int = 1,
+        cache_path: Optional[Path] = None,
+        quantization: QuantizationMethod = QuantizationMethod.TRUNCATE
+) -> Optional[Tuple[QuantizationReport, QuantizationReport]]:
+    """
+    Error de cuantización de cada tabla antes (truncamiento) y después de optimizar
+    con `quantization`; None con TRUNCATE. Se guarda en el caché junto con las tablas.
+    """
+    tables = _get_tables(F_osc, switching_frequency, output_frequency, modulation_indices, TMR2_prescaler,
+                         cache_path, quantization)
+
+    return _get_reports(tables)
+
+
+def _get_reports(tables: Dict[str, np.ndarray]) -> Optional[Tuple[QuantizationReport, QuantizationReport]]:
+    if 'before_dc_offset' not in tables:
+        return None
+
+    return tuple(QuantizationReport(**{field.name: tables[f'{stage}_{field.name}'] for field in fields(QuantizationReport)})
+                 for stage in ('before', 'after'))
+
+
+def _get_tables(
+        F_osc: int, switching_frequency: float,
+        output_frequency: float,
+        modulation_indices: Iterable[float],
+        TMR2_prescaler: int,
+        cache_path: Optional[Path],
+        quantization: QuantizationMethod
+) -> Dict[str, np.ndarray]:
+    modulation_indices = list(modulation_indices)
+
+    def compute():
+        PR2 = get_pwm_configuration(switching_frequency, F_osc, TMR2_prescaler).PR2
+
+        duty_cycles = get_duty_cycle_matrix(switching_frequency, output_frequency, modulation_indices)
+
+        if quantization == QuantizationMethod.TRUNCATE:
+            CCPRxL_matrix, CCPxCON_matrix = get_CCPRxL_CCPxCON_matrices(PR2, duty_cycles)
+
+            return {'CCPRxL': CCPRxL_matrix, 'CCPxCON': CCPxCON_matrix}
+
+        CCPRxL_matrix, CCPxCON_matrix, before, after = optimize_duty_tables(PR2, duty_cycles, quantization)
+
+        tables = {'CCPRxL': CCPRxL_matrix, 'CCPxCON': CCPxCON_matrix}
+
+        # Los reportes van al caché como arreglos sueltos, p. ej. before_dc_offset
+        for stage, report in (('before', before), ('after', after)):
+            for name, values in asdict(report).items():
+                tables[f'{stage}_{name}'] = values
 
-    duty_cycle_samples = get_duty_cycle_samples(switching_frequency, output_frequency, M=0.5)
+        return tables
 
-    for duty_cycle in duty_cycle_samples[:-1]:
-        result += str(duty_cycle) + ",\n"
+    if cache_path is None:
+        tables = compute()
+    else:
+        key = get_cache_key(generator_version=GENERATOR_VERSION,
+                            F_osc=F_osc,
+                            switching_frequency=switching_frequency,
+                            output_frequency=output_frequency,
+                            modulation_indices=modulation_indices,
+                            TMR2_prescaler=TMR2_prescaler,
+                            quantization=quantization.name)
 
-    result += str(duty_cycle_samples[-1]) + "\n"
-    result += "};\n\n"
+        tables = get_cached_tables(key, compute, cache_path)
 
-    return result
+    return tables
+
+
+def write_CCPRxL_CCPxCON_tables(
+        sink: TextIO,
+        F_osc: int, switching_frequency: float,
+        output_frequency: float,
+        modulation_indices: Iterable[float],
+        TMR2_prescaler: int = 1,
+        cache_path: Optional[Path] = None,
+        quarter_wave: bool = False,
+        packed: bool = False,
+        quantization: QuantizationMethod = QuantizationMethod.TRUNCATE
+):
+    """
+    Escribe un par de tablas CCPRxL/CCPxCON por índice de modulación. Con
+    `quarter_wave` solo se escribe el primer cuarto de onda de cada tabla, y con
+    `packed` se guardan los bits CCPxCON<5:4> de cuatro muestras por byte. Con
+    `quantization` distinto de TRUNCATE, cada par de tablas lleva un comentario con
+    el offset DC y el error en los armónicos antes y después de optimizar.
+    """
+    modulation_indices = list(modulation_indices)
+
+    if quarter_wave and quantization != QuantizationMethod.TRUNCATE:
+        raise ValueError('Quarter-wave compression requires truncated tables; '
+                         'error diffusion breaks the quarter-wave symmetry')
+
+    tables = _get_tables(F_osc, switching_frequency, output_frequency, modulation_indices, TMR2_prescaler,
+                         cache_path, quantization)
+
+    CCPRxL_matrix, CCPxCON_matrix = tables['CCPRxL'], tables['CCPxCON']
+    reports = _get_reports(tables)
+
+    if quarter_wave:
+        PR2 = get_pwm_configuration(switching_frequency, F_osc, TMR2_prescaler).PR2
+
+        CCPRxL_matrix, CCPxCON_matrix = compress_quarter_wave(CCPRxL_matrix, CCPxCON_matrix, PR2)
+
+    if packed:
+        CCPxCON_matrix = pack_CCPxCON(CCPxCON_matrix)
+
+    for i, modulation_index in enumerate(modulation_indices):
+        CCPRxL_values, CCPxCON_values = CCPRxL_matrix[i], CCPxCON_matrix[i]
+
+        if reports is not None:
+            before, after = reports
+
+            # Solo ASCII: el comentario termina en el encabezado que compila XC8
+            sink.write(f'// {quantization.name}: DC {before.dc_offset[i]:+.3f} -> {after.dc_offset[i]:+.3f} LSB, '
+                       f'armonicos {before.harmonic_error[i]:.4f} -> {after.harmonic_error[i]:.4f} LSB\n')
+
+        write_program_memory_table(sink, 'uint8_t', f'ccprxl_values_for_{100 * modulation_index:.0f}', CCPRxL_values.tolist())
+        write_program_memory_table(sink, 'uint8_t', f'ccpxcon_values_for_{100 * modulation_index:.0f}', CCPxCON_values.tolist())
 
 
 def generate_CCPRxL_CCPxCON(
         F_osc: int, switching_frequency: float,
-        output_frequency: 50,
-        modulation_index: float
+        output_frequency: float,
+        modulation_index: float,
+        TMR2_prescaler: int = 1
+):
+    result = StringIO()
+
+    write_CCPRxL_CCPxCON_tables(result, F_osc, switching_frequency, output_frequency,
+                                [modulation_index], TMR2_prescaler)
+
+    return result.getvalue()
+
+
+class TableMode(Enum):
+    PER_INDEX = auto()  # Un par de tablas CCPRxL/CCPxCON por índice de modulación
+    SINE_BASIS = auto()  # Una sola tabla de seno en punto fijo escalada en el ISR
+    DDS = auto()  # Tabla de seno de 2^n muestras recorrida por un acumulador de fase
+
+
+@dataclass(frozen=True)
+class SpwmHeaderOptions:
+    mode: TableMode = TableMode.PER_INDEX
+
+    # TableMode.PER_INDEX
+    quarter_wave: bool = False
+    packed: bool = False
+    quantization: QuantizationMethod = QuantizationMethod.TRUNCATE
+
+    # TableMode.SINE_BASIS y TableMode.DDS
+    basis_fraction_bits: int = 15
+
+    # TableMode.DDS
+    output_frequencies: Tuple[float, ...] = ()
+    dds_table_bits: int = DEFAULT_TABLE_BITS
+    dds_accumulator_bits: int = DEFAULT_ACCUMULATOR_BITS
+
+    # Una sola tabla compartida por las tres fases, desfasadas 120° y 240°
+    three_phase: bool = False
+
+    def get_cache_inputs(self) -> dict:
+        inputs = asdict(self)
+        inputs['mode'] = self.mode.name
+        inputs['quantization'] = self.quantization.name
+
+        return inputs
+
+
+def write_per_index_tables(
+        sink: TextIO,
+        switching_frequency: float,
+        output_frequency: float,
+        modulation_indices: List[float],
+        F_osc: int,
+        TMR2_prescaler: int,
+        cache_path: Optional[Path],
+        options: SpwmHeaderOptions
 ):
-    TMR2_prescaler = 1
+    names = [f'{100 * mod:.0f}' for mod in modulation_indices]
+
+    if options.packed:
+        write_packed_accessors(sink)
+    else:
+        sink.write('#define SPWM_CCPXCON_AT(table, i) ((table)[i])\n\n')
+
+    if options.quarter_wave:
+        write_quarter_wave_accessors(sink, get_pwm_configuration(switching_frequency, F_osc, TMR2_prescaler).PR2)
+    else:
+        sink.write('#define SPWM_CCPRXL(table, k) ((table)[k])\n')
+        sink.write('#define SPWM_CCPXCON(table, k) SPWM_CCPXCON_AT(table, k)\n\n')
 
-    PR2 = getPR2value(switching_frequency, F_osc, TMR2_prescaler)
+    write_CCPRxL_CCPxCON_tables(sink, F_osc, switching_frequency, output_frequency, modulation_indices,
+                                TMR2_prescaler, cache_path, options.quarter_wave, options.packed,
+                                options.quantization)
 
-    duty_cycle_samples = get_duty_cycle_samples(switching_frequency_hz, output_frequency, modulation_index)
+    sink.write(f"const uint8_t *ccprxl_tables[{len(names)}] = {{\n")
+    write_initializer_list(sink, (f'ccprxl_values_for_{name}' for name in names), values_per_line=1)
+    sink.write('};\n\n')
 
-    iter1, iter2 = tee(getCCPRxL_CCPxCON(PR2, duty_cycle_sample) for duty_cycle_sample in duty_cycle_samples)
+    sink.write(f"const uint8_t *ccpxcon_tables[{len(names)}] = {{\n")
+    write_initializer_list(sink, (f'ccpxcon_values_for_{name}' for name in names), values_per_line=1)
+    sink.write('};\n\n')
 
-    CCPRxL_values = [CCPRxL_CCPxCON[0] for CCPRxL_CCPxCON in iter1]
-    CCPxCON_values = [CCPRxL_CCPxCON[1] for CCPRxL_CCPxCON in iter2]
 
-    result = ""
-    result += generate_program_memory_table('uint8_t', f'ccprxl_values_for_{100 * modulation_index:.0f}', CCPRxL_values)
-    result += generate_program_memory_table('uint8_t', f'ccpxcon_values_for_{100 * modulation_index:.0f}', CCPxCON_values)
+def write_sine_basis_tables(
+        sink: TextIO,
+        sine_basis: FixedPointSineBasis,
+        modulation_indices: List[float]
+):
+    write_fixed_point_accessors(sink, sine_basis)
+
+    write_program_memory_table(sink, sine_basis.c_type, 'sine_basis', sine_basis.basis.tolist())
+
+    # Índices discretos en Q15, para que los mensajes SYNC actuales sigan funcionando
+    write_program_memory_table(sink, 'uint16_t', 'modulation_index_q15',
+                               get_modulation_index_q15(modulation_indices).tolist())
 
-    return result
 
+def write_dds_tables(
+        sink: TextIO,
+        switching_frequency: float,
+        output_frequencies: List[float],
+        options: SpwmHeaderOptions
+):
+    phase_increments = get_phase_increments(output_frequencies, switching_frequency, options.dds_accumulator_bits)
+
+    write_dds_accessors(sink, options.dds_accumulator_bits, options.dds_table_bits)
 
-def write_spwm_header_file(switching_frequency: float, output_frequency: float, modulation_index: float):
-    with open(MPLAB_PROJECT_PATH.joinpath("spwm_tables.h"), "w+") as f:
+    write_program_memory_table(sink, 'uint32_t', 'dds_phase_increments', phase_increments.tolist(),
+                               values_per_line=8)
+
+    sink.write('typedef enum output_frequencies {\n')
+    write_initializer_list(sink, (f'OUTPUT_FREQUENCY_{frequency:g}'.replace('.', '_') + f' = {i}'
+                                  for i, frequency in enumerate(output_frequencies)), values_per_line=1)
+    sink.write('} output_frequencies_enum;\n\n')
+
+
+def write_spwm_header(
+        sink: TextIO,
+        switching_frequency: float,
+        output_frequency: float,
+        modulation_indices: Iterable[float] = MODULATION_INDICES,
+        F_osc: int = int(32e6),
+        TMR2_prescaler: int = 1,
+        cache_path: Optional[Path] = None,
+        options: SpwmHeaderOptions = SpwmHeaderOptions()
+):
+    modulation_indices = list(modulation_indices)
+    names = [f'{100 * mod:.0f}' for mod in modulation_indices]
+
+    if options.mode == TableMode.DDS:
+        N = 1 << options.dds_table_bits
+    else:
         N = int(switching_frequency / output_frequency)  # Number of samples
 
-        f.write('#ifndef SPWM_TABLE_H\n')
-        f.write('#define SPWM_TABLE_H\n\n')
-        f.write('#include <stdint.h>\n\n')
-        f.write(f'#define SPWM_TABLE_SIZE {N}\n\n')
-        # f.write(generate_sin_table(switching_frequency, output_frequency))
+    sink.write('#ifndef SPWM_TABLE_H\n')
+    sink.write('#define SPWM_TABLE_H\n\n')
+    sink.write('#include <stdint.h>\n\n')
+    sink.write(f'#define SPWM_TABLE_SIZE {N}\n\n')
+    # sink.write(generate_sin_table(switching_frequency, output_frequency))
 
-        for mod in range(20, 96, 5):
-            f.write(generate_CCPRxL_CCPxCON(int(32e6), switching_frequency, output_frequency, mod / 100))
+    if options.three_phase:
+        if options.mode == TableMode.DDS:
+            raise ValueError('Three-phase offsets cannot land exactly on samples of a power-of-two DDS table')
 
-        f.write("const uint8_t *ccprxl_tables[16] = {\n")
+        write_three_phase_accessors(sink, N)
 
-        for mod in range(20, 95, 5):
-            f.write(f'ccprxl_values_for_{mod},\n')
+    if options.mode == TableMode.PER_INDEX:
+        write_per_index_tables(sink, switching_frequency, output_frequency, modulation_indices,
+                               F_osc, TMR2_prescaler, cache_path, options)
+    else:
+        PR2 = get_pwm_configuration(switching_frequency, F_osc, TMR2_prescaler).PR2
 
-        f.write('ccprxl_values_for_95\n};\n\n')
+        if options.mode == TableMode.DDS:
+            sine_basis = get_dds_sine_basis(PR2, options.dds_table_bits, options.basis_fraction_bits)
 
-        f.write("const uint8_t *ccpxcon_tables[16] = {\n")
+            write_dds_tables(sink, switching_frequency,
+                             list(options.output_frequencies or (output_frequency,)), options)
+        else:
+            sine_basis = get_fixed_point_sine_basis(switching_frequency, output_frequency, PR2,
+                                                    options.basis_fraction_bits)
 
-        for mod in range(20, 95, 5):
-            f.write(f'ccpxcon_values_for_{mod},\n')
+        write_sine_basis_tables(sink, sine_basis, modulation_indices)
 
-        f.write('ccpxcon_values_for_95\n};\n\n')
+    sink.write('typedef enum modulation_index_tables {\n')
+    write_initializer_list(sink, (f'MODULATION_INDEX_{name} = {i}' for i, name in enumerate(names)), values_per_line=1)
+    sink.write('} modulation_index_tables_enum;\n\n')
 
-        f.write('typedef enum modulation_index_tables {\n')
+    sink.write('#endif')
 
-        for i, mod in enumerate(range(20, 95, 5)):
-            f.write(f'MODULATION_INDEX_{mod} = {i},\n')
 
-        f.write('MODULATION_INDEX_95 = 15\n} modulation_index_tables_enum;\n\n')
+def write_spwm_indices(sink: TextIO, modulation_indices: Iterable[float] = MODULATION_INDICES):
+    sink.write('from enum import Enum\n\n\n')
+    sink.write('class ModulationIndex(Enum):\n')
 
-        f.write('#endif')
+    indent = ' ' * 4
 
-    with open('./spwm_indices.py', 'w+') as f:
-        f.write('from enum import Enum\n\n\n')
-        f.write('class ModulationIndex(Enum):\n')
+    for i, mod in enumerate(modulation_indices):
+        sink.write(indent + f"MODULATION_INDEX_{100 * mod:.0f} = {i}\n")
 
-        indent = ' ' * 4
+    sink.write('\n')
 
-        for i, mod in enumerate(range(20, 96, 5)):
-            f.write(indent + f"MODULATION_INDEX_{mod} = {i}\n")
 
-        f.write('\n')
+def check_header_thd(
+        switching_frequency: float,
+        output_frequency: float,
+        modulation_indices: List[float],
+        F_osc: int,
+        TMR2_prescaler: int,
+        cache_path: Optional[Path],
+        options: SpwmHeaderOptions,
+        baseline_path: Path,
+        tolerance: float = 0.01,
+        update: bool = False
+):
+    """
+    Analiza las formas de onda que generaría el encabezado y lanza ThdRegressionError
+    si el THD de alguna tabla empeora respecto a `baseline_path`. La referencia es la
+    de las mismas entradas del generador; con `update` se reemplaza.
+    """
+    PR2 = get_pwm_configuration(switching_frequency, F_osc, TMR2_prescaler).PR2
+
+    if options.mode == TableMode.PER_INDEX:
+        CCPRxL, CCPxCON = get_CCPRxL_CCPxCON_tables(F_osc, switching_frequency, output_frequency, modulation_indices,
+                                                    TMR2_prescaler, cache_path, options.quantization)
+
+        report = analyze_register_tables(CCPRxL, CCPxCON, PR2, cache_path=cache_path)
+    elif options.mode == TableMode.SINE_BASIS:
+        sine_basis = get_fixed_point_sine_basis(switching_frequency, output_frequency, PR2, options.basis_fraction_bits)
+
+        duty_cycles = get_fixed_point_duty_values(sine_basis, modulation_indices) / (4 * (PR2 + 1))
+
+        report = analyze_duty_cycles(duty_cycles, cache_path=cache_path)
+    else:
+        raise ValueError('The THD gate only supports sample-indexed tables (PER_INDEX and SINE_BASIS)')
+
+    # Sin los índices: cada tabla depende solo de su índice, que va aparte en la referencia
+    configuration = get_cache_key(generator_version=GENERATOR_VERSION,
+                                  F_osc=F_osc,
+                                  switching_frequency=switching_frequency,
+                                  output_frequency=output_frequency,
+                                  TMR2_prescaler=TMR2_prescaler,
+                                  options=options.get_cache_inputs())
+
+    check_thd_regression(report, modulation_indices, baseline_path, configuration, tolerance, update)
+
+
+def write_spwm_header_file(switching_frequency: float, output_frequency: float, modulation_index: float,
+                           F_osc: int = int(32e6), TMR2_prescaler: int = 1,
+                           cache_path: Path = CACHE_PATH,
+                           options: SpwmHeaderOptions = SpwmHeaderOptions(),
+                           thd_baseline_path: Optional[Path] = None, update_thd_baseline: bool = False) -> bool:
+    """
+    Escribe spwm_tables.h y spwm_indices.py. Los archivos solo se reescriben si su
+    contenido cambia, para no forzar una recompilación completa en MPLAB.
+    Retorna si alguno de los dos archivos fue modificado.
+
+    Si se entrega `thd_baseline_path`, antes de escribir se verifica que el THD de
+    las tablas no haya empeorado (ver spwm_analysis.check_thd_regression); con
+    `update_thd_baseline` el THD actual pasa a ser la referencia.
+    """
+    if thd_baseline_path is not None:
+        check_header_thd(switching_frequency, output_frequency, MODULATION_INDICES, F_osc, TMR2_prescaler,
+                         cache_path, options, thd_baseline_path, update=update_thd_baseline)
+
+    key = get_cache_key(generator_version=GENERATOR_VERSION,
+                        F_osc=F_osc,
+                        switching_frequency=switching_frequency,
+                        output_frequency=output_frequency,
+                        modulation_indices=MODULATION_INDICES,
+                        TMR2_prescaler=TMR2_prescaler,
+                        options=options.get_cache_inputs())
+
+    header_changed = write_output(
+        MPLAB_PROJECT_PATH.joinpath("spwm_tables.h"), key,
+        lambda f: write_spwm_header(f, switching_frequency, output_frequency, MODULATION_INDICES,
+                                    F_osc, TMR2_prescaler, cache_path, options),
+        cache_path, buffering=WRITE_BUFFER_SIZE
+    )
+
+    indices_changed = write_output(Path('./spwm_indices.py'), key, write_spwm_indices, cache_path)
+
+    return header_changed or indices_changed
 
 
 def get_duty_cycle_samples(switching_frequency: float, output_frequency:float, M: float):
@@ -148,11 +539,26 @@ def get_duty_cycle_samples(switching_frequency: float, output_frequency:float, M
 
 
 if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description='Genera spwm_tables.h y spwm_indices.py')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help=f'Guarda el THD actual como referencia en {THD_BASELINE_PATH}')
+
+    args = parser.parse_args()
+
     switching_frequency_hz = 40e3
 
     output_frequency_hz = 100
 
     # duty_cycle_samples = get_duty_cycle_samples(switching_frequency_hz, output_frequency_hz, 0.1)
     # print(duty_cycle_samples)
-    write_spwm_header_file(switching_frequency_hz, output_frequency_hz, 0.95)
+    if not THD_BASELINE_PATH.exists() and not args.update_baseline:
+        print('Sin referencia de THD; se crea con --update-baseline.')
+
+    if write_spwm_header_file(switching_frequency_hz, output_frequency_hz, 0.95, thd_baseline_path=THD_BASELINE_PATH,
+                              update_thd_baseline=args.update_baseline):
+        print('Tablas actualizadas.')
+    else:
+        print('Las tablas no cambiaron.')
 
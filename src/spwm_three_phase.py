@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+from typing import TextIO, Tuple
+
+import numpy as np
+
+
+PHASES = 3
+
+
+@dataclass(frozen=True)
+class ThreePhaseBalance:
+    """ Balance de las tensiones de línea, un elemento por índice de modulación """
+    line_to_line_amplitude: np.ndarray  # (..., 3) amplitud de la fundamental de v_ab, v_bc, v_ca (en ciclo de trabajo)
+    line_to_line_phase: np.ndarray  # (..., 3) fase de la fundamental, en grados
+    amplitude_imbalance: np.ndarray  # (max - min) / promedio de las amplitudes de línea
+    phase_error: np.ndarray  # máxima desviación respecto a 120° entre tensiones de línea, en grados
+    zero_sequence: np.ndarray  # máxima desviación de (d_a + d_b + d_c) / 3 respecto a su promedio
+
+
+def get_phase_offsets(N: int) -> Tuple[int, int, int]:
+    """
+    Desplazamiento de muestras de las fases A, B y C sobre la tabla compartida.
+    B atrasa a A en 120° y C atrasa a A en 240°.
+    """
+    if N % PHASES:
+        raise ValueError(f'SPWM table size must be a multiple of 3 for three-phase operation (N = {N})')
+
+    return 0, 2 * N // PHASES, N // PHASES
+
+
+def get_three_phase_duty_cycles(duty_cycles: np.ndarray) -> np.ndarray:
+    """
+    Ciclos de trabajo de las tres fases leídos de la misma tabla, igual que en el
+    ISR. Entrega un arreglo de forma (..., 3, N).
+    """
+    duty_cycles = np.asarray(duty_cycles)
+
+    N = duty_cycles.shape[-1]
+
+    offsets = np.asarray(get_phase_offsets(N))[:, np.newaxis]
+    indices = (np.arange(N) + offsets) % N
+
+    return duty_cycles[..., indices]
+
+
+def get_line_to_line_balance(phase_duty_cycles: np.ndarray) -> ThreePhaseBalance:
+    phase_duty_cycles = np.asarray(phase_duty_cycles, dtype=float)
+
+    N = phase_duty_cycles.shape[-1]
+
+    # v_ab, v_bc, v_ca
+    line_to_line = phase_duty_cycles - np.roll(phase_duty_cycles, -1, axis=-2)
+
+    fundamental = np.fft.rfft(line_to_line, axis=-1)[..., 1] * 2 / N
+
+    amplitude = np.abs(fundamental)
+    phase = np.degrees(np.angle(fundamental))
+
+    phase_steps = np.degrees(np.angle(fundamental / np.roll(fundamental, -1, axis=-1)))
+    phase_error = np.abs(phase_steps - 120).max(axis=-1)
+
+    zero_sequence = phase_duty_cycles.mean(axis=-2)
+    zero_sequence = np.abs(zero_sequence - zero_sequence.mean(axis=-1, keepdims=True)).max(axis=-1)
+
+    return ThreePhaseBalance(
+        line_to_line_amplitude=amplitude,
+        line_to_line_phase=phase,
+        amplitude_imbalance=(amplitude.max(axis=-1) - amplitude.min(axis=-1)) / amplitude.mean(axis=-1),
+        phase_error=phase_error,
+        zero_sequence=zero_sequence
+    )
+
+
+def write_three_phase_accessors(sink: TextIO, N: int):
+    """ Índices de las fases B y C sobre la tabla compartida, a partir del índice k de la fase A """
+    _, phase_b_offset, phase_c_offset = get_phase_offsets(N)
+
+    sink.write('#define SPWM_THREE_PHASE 1\n')
+    sink.write(f'#define SPWM_PHASE_B_OFFSET {phase_b_offset}\n')
+    sink.write(f'#define SPWM_PHASE_C_OFFSET {phase_c_offset}\n\n')
+
+    sink.write('#define SPWM_PHASE_INDEX(k, offset) '
+               '((k) >= SPWM_TABLE_SIZE - (offset) ? (k) + (offset) - SPWM_TABLE_SIZE : (k) + (offset))\n\n')
+
+
+if __name__ == "__main__":
+    from pic_formulas import getPR2value
+    from spwm_engine import get_duty_cycle_matrix, get_CCPRxL_CCPxCON_matrices
+
+    switching_frequency_hz = 30e3
+    output_frequency_hz = 50
+
+    modulation_indices = [mod / 100 for mod in range(20, 96, 5)]
+
+    PR2 = getPR2value(switching_frequency_hz, int(48e6), 4)
+
+    duty_cycles = get_duty_cycle_matrix(switching_frequency_hz, output_frequency_hz, modulation_indices)
+    CCPRxL, CCPxCON = get_CCPRxL_CCPxCON_matrices(PR2, duty_cycles)
+
+    # Se evalúa lo que realmente carga el PWM: el valor de 10 bits cuantizado
+    quantized_duty_cycles = ((CCPRxL << 2) | CCPxCON) / (4 * (PR2 + 1))
+
+    balance = get_line_to_line_balance(get_three_phase_duty_cycles(quantized_duty_cycles))
+
+    for i, M in enumerate(modulation_indices):
+        print(f'M = {M:.2f}: amplitud de línea {balance.line_to_line_amplitude[i].mean():.4f}, '
+              f'desbalance {100 * balance.amplitude_imbalance[i]:.4f} %, '
+              f'error de fase {balance.phase_error[i]:.4f}°')
@@ -0,0 +1,58 @@
+from argparse import ArgumentParser
+from statistics import median
+from time import perf_counter
+from typing import List
+
+from serial_communication import conn, open_port, sync
+from spwm_indices import ModulationIndex
+
+
+def measure_reopen(port_name: str, baudrate: int, timeout: float, n: int) -> List[float]:
+    """ Como lo hacía el worker antes: un Serial nuevo por cada SYNC """
+    times = []
+
+    for i in range(n):
+        start = perf_counter()
+
+        with open_port(port_name, baudrate, timeout) as s:
+            sync(s, ModulationIndex(i % len(ModulationIndex)))
+
+        times.append(perf_counter() - start)
+
+    return times
+
+
+def measure_persistent(port_name: str, baudrate: int, timeout: float, n: int) -> List[float]:
+    """ Un solo puerto abierto durante toda la sesión """
+    times = []
+
+    with open_port(port_name, baudrate, timeout) as s:
+        for i in range(n):
+            start = perf_counter()
+
+            sync(s, ModulationIndex(i % len(ModulationIndex)))
+
+            times.append(perf_counter() - start)
+
+    return times
+
+
+def print_times(name: str, times: List[float]):
+    print(f'{name}: {len(times) / sum(times):.1f} SYNC/s, '
+          f'mediana {1e3 * median(times):.2f} ms, máximo {1e3 * max(times):.2f} ms')
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Round trips SYNC/ACK por segundo, reabriendo el puerto o no')
+    parser.add_argument('port')
+    parser.add_argument('--baudrate', type=int, default=9600)
+    parser.add_argument('--timeout', type=float, default=0.5)
+    parser.add_argument('-n', type=int, default=200)
+
+    args = parser.parse_args()
+
+    with open_port(args.port, args.baudrate, args.timeout) as serial_port:
+        print(f'Conectado, índice de modulación del dispositivo: {conn(serial_port)[0].name}')
+
+    print_times('Reabriendo el puerto', measure_reopen(args.port, args.baudrate, args.timeout, args.n))
+    print_times('Puerto persistente', measure_persistent(args.port, args.baudrate, args.timeout, args.n))
@@ -0,0 +1,188 @@
+from collections import deque
+from pathlib import Path
+from typing import Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+# Respuesta del dispositivo a FETCH: [PR2, CCPRxL, CCPxCON]
+TELEMETRY_FIELDS = ('PR2', 'CCPRxL', 'CCPxCON')
+
+# Registro en disco: timestamp (time.monotonic) y un byte por campo, 11 bytes en total
+TELEMETRY_RECORD_DTYPE = np.dtype([('timestamp', '<f8')] + [(field, 'u1') for field in TELEMETRY_FIELDS])
+
+
+class TelemetryRing:
+    """
+    Buffer circular preasignado. Cada muestra se escribe dos veces, en `i` y en
+    `i + capacity`, así que las últimas n muestras siempre son contiguas en memoria y
+    `get_window` entrega vistas sin copiar. Lo escribe solo el loop de trio. Una
+    ventana de n muestras sigue válida mientras lleguen hasta `capacity - n` muestras
+    nuevas (ninguna si n == capacity); quien la use después, p. ej. desde otro hilo,
+    debe copiarla.
+    """
+
+    def __init__(self, capacity: int = 4096, fields: Sequence[str] = TELEMETRY_FIELDS):
+        if capacity < 1:
+            raise ValueError('Capacity must be at least 1')
+
+        self.capacity = capacity
+        self.fields = tuple(fields)
+
+        self._timestamps = np.zeros(2 * capacity)
+        self._values = np.zeros((2 * capacity, len(self.fields)), dtype=np.uint8)
+
+        self.total = 0  # Muestras recibidas desde el inicio, incluidas las ya sobrescritas
+
+    def __len__(self) -> int:
+        return min(self.total, self.capacity)
+
+    def append(self, timestamp: float, values):
+        """ `values`: un valor por campo, o los bytes de la respuesta tal como llegan """
+        if isinstance(values, (bytes, bytearray, memoryview)):
+            values = np.frombuffer(values, dtype=np.uint8)
+
+        i = self.total % self.capacity
+
+        self._timestamps[i] = self._timestamps[i + self.capacity] = timestamp
+        self._values[i] = self._values[i + self.capacity] = values
+
+        # Se publica después de escribir, para que un lector no vea una muestra a medias
+        self.total += 1
+
+    def get_window(self, n: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Las últimas `n` muestras (todas si es None): timestamps (n,) y valores (n,
+        campos), de solo lectura. Son vistas: la próxima muestra ya pisa la primera de
+        una ventana completa (ver la clase).
+        """
+        total = self.total
+        available = min(total, self.capacity)
+
+        n = available if n is None else min(n, available)
+        end = total % self.capacity + self.capacity
+
+        timestamps = self._timestamps[end - n:end]
+        values = self._values[end - n:end]
+
+        timestamps.flags.writeable = False
+        values.flags.writeable = False
+
+        return timestamps, values
+
+    def get_field(self, field: str, n: Optional[int] = None) -> np.ndarray:
+        return self.get_window(n)[1][:, self.fields.index(field)]
+
+
+class DecimatingWriter:
+    """
+    Guarda una de cada `decimation` muestras como registros TELEMETRY_RECORD_DTYPE.
+    Los registros se juntan en bloques de `block_size` y se agregan al archivo cuando
+    se llena uno (o con `flush`), así que la memoria no crece con la duración de la
+    captura. El archivo se lee con `read_telemetry`.
+
+    Sin `auto_flush`, `write` no toca el archivo: avisa cuando completó un bloque y
+    quien escribe llama a `write_ready` (p. ej. en un hilo de trio), que escribe los
+    bloques en orden y se puede correr en otro hilo mientras siguen llegando muestras.
+    """
+
+    def __init__(self, path: Union[str, Path], decimation: int = 1, block_size: int = 1024, auto_flush: bool = True):
+        if decimation < 1:
+            raise ValueError('Decimation must be at least 1')
+
+        self.path = Path(path)
+        self.decimation = decimation
+        self.auto_flush = auto_flush
+
+        self._block = np.zeros(block_size, dtype=TELEMETRY_RECORD_DTYPE)
+        self._count = 0
+
+        # Bloques completos a la espera de escribirse, en orden
+        self._ready = deque()
+
+        self._seen = 0
+        self.written = 0
+
+    def write(self, timestamp: float, values) -> bool:
+        """ Entrega True si completó un bloque que todavía no se escribió (solo sin `auto_flush`) """
+        seen, self._seen = self._seen, self._seen + 1
+
+        if seen % self.decimation:
+            return False
+
+        record = self._block[self._count]
+        record['timestamp'] = timestamp
+
+        for field, value in zip(TELEMETRY_FIELDS, values):
+            record[field] = value
+
+        self._count += 1
+
+        if self._count < len(self._block):
+            return False
+
+        self.stage()
+
+        if self.auto_flush:
+            self.write_ready()
+
+            return False
+
+        return True
+
+    def stage(self):
+        """ Pasa los registros juntados a la cola de escritura, sin tocar el archivo """
+        if not self._count:
+            return
+
+        block = self._block
+
+        # Bloque nuevo: el anterior puede estar escribiéndose en otro hilo
+        self._block = np.zeros(len(block), dtype=TELEMETRY_RECORD_DTYPE)
+
+        self._ready.append(block[:self._count])
+        self._count = 0
+
+    def write_ready(self):
+        """ Escribe los bloques en cola; no debe correr en dos hilos a la vez """
+        if not self._ready:
+            return
+
+        with open(self.path, 'ab') as f:
+            while self._ready:
+                block = self._ready.popleft()
+                block.tofile(f)
+
+                self.written += len(block)
+
+    def flush(self):
+        self.stage()
+        self.write_ready()
+
+
+def read_telemetry(path: Union[str, Path]) -> np.ndarray:
+    """ Arreglo estructurado con los campos de TELEMETRY_RECORD_DTYPE """
+    return np.fromfile(path, dtype=TELEMETRY_RECORD_DTYPE)
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description='Resumen de un archivo de telemetría')
+    parser.add_argument('path')
+
+    args = parser.parse_args()
+
+    records = read_telemetry(args.path)
+
+    if not len(records):
+        print('Archivo vacío')
+    else:
+        duration = records['timestamp'][-1] - records['timestamp'][0]
+
+        print(f'{len(records)} registros en {duration:.1f} s')
+
+        for field in TELEMETRY_FIELDS:
+            values = records[field]
+
+            print(f'{field:8s} min {values.min():3d}, max {values.max():3d}, último {values[-1]:3d}')
@@ -0,0 +1,94 @@
+from concurrent.futures import Future
+from threading import Event, Thread
+from typing import Any, Awaitable, Callable, Optional
+
+import trio
+
+
+def call(callback: Callable[[], None]):
+    callback()
+
+
+def get_result(future: Future, default: Any = None) -> Any:
+    """ Resultado de un Future ya terminado, o `default` si falló o se canceló (el error queda en el Future) """
+    if future.cancelled() or future.exception() is not None:
+        return default
+
+    return future.result()
+
+
+class TrioBridge:
+    """
+    Corre un loop de trio en un hilo propio para que código síncrono (la GUI de Kivy,
+    scripts) lance corrutinas sin bloquearse. `submit` entrega un Future; los
+    callbacks se ejecutan a través de `dispatch`, que en la GUI los pasa al Clock de
+    Kivy para que corran en el hilo principal.
+    """
+
+    def __init__(self, dispatch: Callable[[Callable[[], None]], None] = call):
+        self._dispatch = dispatch
+
+        self._token: Optional[trio.lowlevel.TrioToken] = None
+        self._nursery: Optional[trio.Nursery] = None
+        self._ready = Event()
+
+        self.thread = Thread(target=trio.run, args=(self._main,), daemon=True)
+        self.thread.start()
+
+        self._ready.wait()
+
+    async def _main(self):
+        self._token = trio.lowlevel.current_trio_token()
+
+        async with trio.open_nursery() as nursery:
+            self._nursery = nursery
+            self._ready.set()
+
+            # Mantiene el nursery abierto hasta que se llame a close()
+            await trio.sleep_forever()
+
+    @staticmethod
+    async def _run(future: Future, async_fn: Callable[..., Awaitable[Any]], args):
+        if not future.set_running_or_notify_cancel():
+            return
+
+        try:
+            result = await async_fn(*args)
+        except BaseException as e:
+            future.set_exception(e)
+
+            if not isinstance(e, Exception):
+                raise
+        else:
+            future.set_result(result)
+
+    def submit(self, async_fn: Callable[..., Awaitable[Any]], *args,
+               callback: Optional[Callable[[Future], None]] = None) -> Future:
+        """ Programa `async_fn(*args)` en el loop de trio sin esperar a que termine """
+        future = Future()
+
+        if callback is not None:
+            future.add_done_callback(lambda done: self._dispatch(lambda: callback(done)))
+
+        trio.from_thread.run_sync(self._nursery.start_soon, self._run, future, async_fn, args,
+                                  trio_token=self._token)
+
+        return future
+
+    def dispatch(self, callback: Callable[[], None]):
+        """ Ejecuta `callback` en el hilo que corresponde (ver `dispatch` en el constructor) """
+        self._dispatch(callback)
+
+    def call_soon(self, fn: Callable[..., Any], *args):
+        """ Ejecuta `fn(*args)` en el loop de trio sin esperar; se puede llamar desde cualquier hilo """
+        self._token.run_sync_soon(fn, *args)
+
+    def spawn(self, async_fn: Callable[..., Awaitable[Any]], *args):
+        """ Como `submit`, pero desde una tarea que ya corre en el loop de trio """
+        self._nursery.start_soon(async_fn, *args)
+
+    def close(self):
+        """ Cancela las tareas pendientes y termina el hilo de trio """
+        trio.from_thread.run_sync(self._nursery.cancel_scope.cancel, trio_token=self._token)
+
+        self.thread.join()
@@ -0,0 +1,142 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+
+# Versión de protocolo que se pide en el CONN: [PROTOCOL_WINDOWED, ventana]. El
+# dispositivo que la acepta responde SYNC [índice, ventana concedida]; el firmware
+# anterior responde SYNC [índice] y el enlace sigue en modo pregunta/respuesta.
+PROTOCOL_WINDOWED = 1
+
+SEQUENCE_MODULO = 256
+
+# Con números de secuencia de 8 bits, la ventana no puede pasar de la mitad del espacio
+MAX_WINDOW = SEQUENCE_MODULO // 2 - 1
+
+
+def get_sequence_distance(start: int, end: int) -> int:
+    """ Cuántos números de secuencia hay desde `start` hasta `end` """
+    return (end - start) % SEQUENCE_MODULO
+
+
+@dataclass
+class PendingFrame:
+    seq: int
+    msg_type: int
+    payload: bytes
+    first_sent_at: float
+    sent_at: float
+    deadline: float  # Si no se confirma antes, se reenvía
+    transmissions: int = 1
+
+
+class SendWindow:
+    """
+    Estado del emisor con ventana deslizante. Cada trama de datos lleva su número de
+    secuencia como primer byte. El dispositivo responde:
+
+    - ACK [n]: recibió todo hasta n - 1 (acumulativo).
+    - NACK [n]: recibió todo hasta n - 1 y falta la trama n, que se reenvía sola.
+    - Una trama del mismo tipo con [n, datos...] para las consultas (p. ej. FETCH),
+      que completa solo la trama n.
+
+    Las tramas que no se confirman dentro de su plazo se reenvían una por una; el
+    plazo de cada envío lo decide quien envía.
+    """
+
+    def __init__(self, size: int):
+        if not 1 <= size <= MAX_WINDOW:
+            raise ValueError(f'Window size must be between 1 and {MAX_WINDOW}')
+
+        self.size = size
+
+        self.next_seq = 0
+
+        # En orden de envío: el primero es la base de la ventana
+        self.pending: Dict[int, PendingFrame] = {}
+
+        self.retransmissions = 0
+
+    @property
+    def is_full(self) -> bool:
+        return len(self.pending) >= self.size
+
+    def register(self, msg_type: int, payload: bytes, now: float, timeout: float) -> PendingFrame:
+        if self.is_full:
+            raise RuntimeError('Send window is full')
+
+        frame = PendingFrame(self.next_seq, msg_type, bytes(payload), now, now, now + timeout)
+
+        self.pending[frame.seq] = frame
+        self.next_seq = (self.next_seq + 1) % SEQUENCE_MODULO
+
+        return frame
+
+    def acknowledge(self, ack: int) -> List[PendingFrame]:
+        """ ACK acumulativo: confirma las tramas anteriores a `ack` """
+        if not self.pending:
+            return []
+
+        base = next(iter(self.pending))
+        span = get_sequence_distance(base, ack)
+
+        # Un ACK fuera de la ventana (repetido o atrasado) no confirma nada
+        if span > get_sequence_distance(base, self.next_seq):
+            return []
+
+        # Tras un `complete` puede haber huecos: solo se confirma lo que está entre la base y `ack`
+        acknowledged = [frame for seq, frame in self.pending.items()
+                        if 0 < get_sequence_distance(seq, ack) <= span]
+
+        for frame in acknowledged:
+            del self.pending[frame.seq]
+
+        return acknowledged
+
+    def complete(self, seq: int) -> Optional[PendingFrame]:
+        """ Respuesta con datos a una sola trama """
+        return self.pending.pop(seq, None)
+
+    def get_expired(self, now: float) -> List[PendingFrame]:
+        return [frame for frame in self.pending.values() if now >= frame.deadline]
+
+    def mark_retransmitted(self, frame: PendingFrame, now: float, timeout: float):
+        frame.sent_at = now
+        frame.deadline = now + timeout
+        frame.transmissions += 1
+
+        self.retransmissions += 1
+
+    @staticmethod
+    def is_exhausted(frame: PendingFrame, now: float, failure_timeout: float) -> bool:
+        """ Pasaron `failure_timeout` segundos desde el primer envío sin confirmación """
+        return now - frame.first_sent_at >= failure_timeout
+
+
+if __name__ == "__main__":
+    window = SendWindow(8)
+
+    for i in range(3):
+        window.register(0x10, bytes([i]), 0.0, 1.0)
+
+    # La respuesta a la trama 1 llega antes que el ACK de la 0: la 2 sigue sin confirmar
+    window.complete(1)
+
+    assert [frame.seq for frame in window.acknowledge(1)] == [0]
+    assert list(window.pending) == [2]
+
+    # ACK repetido: no confirma nada
+    assert window.acknowledge(1) == []
+    assert [frame.seq for frame in window.acknowledge(3)] == [2]
+
+    # Con el número de secuencia dando la vuelta
+    window.next_seq = 254
+
+    for i in range(4):
+        window.register(0x10, bytes([i]), 0.0, 1.0)
+
+    window.complete(255)
+
+    assert [frame.seq for frame in window.acknowledge(0)] == [254]
+    assert list(window.pending) == [0, 1]
+
+    print('OK')